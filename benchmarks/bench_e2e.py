@@ -0,0 +1,168 @@
+# benchmarks/bench_e2e.py
+#
+# Benchmark ponta a ponta, sem rede: sobe benchmarks/fake_sources.py
+# (CKAN da CCEE e do ONS + S3 do ONS com dados sintéticos), aponta os
+# scripts para ele (CCEE_CKAN_BASE / ONS_CKAN_BASE / ONS_S3_BASE) e roda
+# cada pipeline duas vezes numa cópia do código, fora do repo (os dados e
+# caches de verdade não são tocados):
+#   frio    árvore limpa: sem SQLite, store, cache de arquivos nem de CKAN
+#   quente  mesma árvore logo depois: caches e checkpoints da rodada fria
+# Para cada rodada: tempo de relógio, bytes servidos, requests por status,
+# linhas dos arquivos de origem cobertos (e linhas/s) e pico de RSS do
+# processo do pipeline.
+#
+# uso: python benchmarks/bench_e2e.py [--pipelines pld eolica solar diario]
+#          [--plants 100] [--days N] [--work DIR] [--json saida.json]
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_sources import FakeSources, env_for  # noqa: E402
+
+DATA_DIR = os.environ.get("BENCH_DATA_DIR", os.path.join(BENCH_DIR, "_data"))
+
+# nome -> script (relativo à raiz do repo)
+PIPELINES = {
+    "pld": "pld_ccee/src/update_pld_2025.py",
+    "eolica": "dashboard/atualizar_coff_monthly.py",
+    "solar": "dashboard/scripts/update_coff_solar_monthly_v3.py",
+    "diario": "run_daily_update.py",
+}
+
+# o que vai para a árvore de trabalho (código + mapping; nada de dados gerados)
+TREE = [
+    "common",
+    "pld_ccee/src",
+    "dashboard/scripts",
+    "dashboard/atualizar_coff_monthly.py",
+    "dashboard/data/mapping_citi.json",
+    "export_pld_json.py",
+    "run_daily_update.py",
+]
+
+# variáveis do ambiente do usuário que fariam a cópia usar caches de fora dela
+CACHE_ENV = ("RAW_CACHE_DIR", "CKAN_CACHE_DIR")
+
+
+def make_tree(dest: str) -> None:
+    """Copia o código do repo para `dest` (scripts resolvem caminhos por __file__)."""
+    for rel in TREE:
+        src = os.path.join(BASE_DIR, rel)
+        dst = os.path.join(dest, rel)
+        if os.path.isdir(src):
+            shutil.copytree(src, dst, ignore=shutil.ignore_patterns("__pycache__"))
+        else:
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            shutil.copy2(src, dst)
+
+
+def run_script(tree: str, script: str, env: dict, log_path: str) -> dict:
+    """Roda o script e devolve {"rc", "seconds", "peak_rss_mb"} (RSS só deste processo)."""
+    with open(log_path, "w", encoding="utf-8") as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen([sys.executable, os.path.join(tree, script)], cwd=tree,
+                                env=env, stdout=log, stderr=subprocess.STDOUT)
+        # wait4: rusage do filho, não o acumulado de RUSAGE_CHILDREN
+        _, status, usage = os.wait4(proc.pid, 0)
+        seconds = time.perf_counter() - t0
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return {"rc": proc.returncode, "seconds": seconds, "peak_rss_mb": usage.ru_maxrss / 1024}
+
+
+def run_pipeline(name: str, sources: FakeSources, env: dict, work: str) -> list:
+    tree = os.path.join(work, name)
+    make_tree(tree)
+    logs = os.path.join(work, "_logs")
+    os.makedirs(logs, exist_ok=True)
+
+    out = []
+    for phase in ("frio", "quente"):
+        sources.reset_stats()
+        res = run_script(tree, PIPELINES[name], env, os.path.join(logs, f"{name}_{phase}.log"))
+        st = sources.stats()
+        rows = sum(st["files"].values())
+        out.append({
+            "pipeline": name,
+            "fase": phase,
+            **res,
+            "bytes": st["bytes"],
+            "requests": st["requests"],
+            "status": st["status"],
+            "rows": rows,
+            "rows_per_s": rows / res["seconds"] if res["seconds"] else 0.0,
+        })
+    return out
+
+
+def print_table(results: list) -> None:
+    print(f"\n{'pipeline':<8} {'fase':<7} {'rc':>3} {'tempo':>8} {'MB':>8} {'requests':<22} "
+          f"{'linhas':>11} {'linhas/s':>11} {'RSS pico':>9}")
+    for r in results:
+        reqs = " ".join(f"{k}:{v}" for k, v in sorted(r["status"].items()))
+        print(f"{r['pipeline']:<8} {r['fase']:<7} {r['rc']:>3} {r['seconds']:>7.1f}s "
+              f"{r['bytes'] / 1e6:>8.1f} {reqs:<22} {r['rows']:>11,} "
+              f"{r['rows_per_s']:>11,.0f} {r['peak_rss_mb']:>7.0f}MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark ponta a ponta contra CKAN/S3 locais.")
+    parser.add_argument("--pipelines", nargs="+", choices=list(PIPELINES),
+                        default=["pld", "eolica", "solar"])
+    parser.add_argument("--plants", type=int, default=100, help="usinas por arquivo do ONS")
+    parser.add_argument("--days", type=int, default=None, help="dias por mês (padrão: mês inteiro)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--work", default=None,
+                        help="diretório das árvores de trabalho e logs (padrão: temporário, apagado no fim)")
+    parser.add_argument("--json", default=None, help="grava os resultados neste arquivo")
+    args = parser.parse_args(argv)
+
+    sources = FakeSources(DATA_DIR, plants=args.plants, days=args.days, seed=args.seed)
+    print(f"Gerando/validando arquivos sintéticos em {sources.data_dir} ...")
+    sources.generate_all()
+    server = sources.serve()
+    print(f"Servidor local: {server.base_url}")
+
+    env = {k: v for k, v in os.environ.items() if k not in CACHE_ENV}
+    env.update(env_for(server.base_url))
+    env["PYTHONUNBUFFERED"] = "1"
+
+    if args.work and os.path.isdir(args.work) and os.listdir(args.work):
+        raise SystemExit(f"{args.work} não está vazio (a rodada fria precisa de árvore limpa)")
+    work = args.work or tempfile.mkdtemp(prefix="bench_e2e_")
+
+    results = []
+    try:
+        for name in args.pipelines:
+            print(f"→ {name} ...")
+            results.extend(run_pipeline(name, sources, env, work))
+    finally:
+        server.shutdown()
+        if args.work is None:
+            shutil.rmtree(work, ignore_errors=True)
+        else:
+            print(f"Árvores e logs em {work}")
+
+    print_table(results)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    failed = [f"{r['pipeline']}/{r['fase']}" for r in results if r["rc"] != 0]
+    if failed:
+        print(f"\n❌ falharam: {', '.join(failed)}"
+              + ("" if args.work else " (use --work DIR para manter os logs)"))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
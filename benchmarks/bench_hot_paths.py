@@ -0,0 +1,263 @@
+# benchmarks/bench_hot_paths.py
+#
+# Benchmarks dos caminhos quentes da atualização diária, sobre dados
+# sintéticos (benchmarks/synthetic.py) em vários tamanhos:
+#   solar_aggregate       monthly_aggregate_one_month (solar v3)
+#   solar_dt_hours        compute_dt_hours (solar v3)
+#   eolica_build_monthly  build_monthly_from_cached_csvs (eólica, sem cache de agregados)
+#   pld_clean             limpeza do PLD de load_csv_to_sqlite (iter_clean_chunks)
+#
+# Cada caso é comparado com benchmarks/baselines.json; tempo acima de
+# baseline * (1 + threshold) conta como regressão e o script sai com 1,
+# desde que a diferença passe também do piso absoluto (--min-delta, 50 ms):
+# nos casos pequenos, alguns ms de ruído já dão mais de 25%.
+# Os baselines dependem da máquina: grave os seus com --record antes de
+# comparar (o _meta do arquivo diz onde foram medidos).
+#
+# uso: python benchmarks/bench_hot_paths.py [--sizes pequeno medio grande]
+#          [--cases ...] [--repeat N] [--threshold 0.25] [--min-delta 0.05] [--record]
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASE_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BASE_DIR)
+sys.path.insert(0, os.path.join(BASE_DIR, "pld_ccee", "src"))
+sys.path.insert(0, os.path.join(BASE_DIR, "dashboard", "scripts"))
+
+import update_coff_eolica_monthly_test as eolica  # noqa: E402
+import update_pld_2025 as pld  # noqa: E402
+import common.coff_solar as solar  # noqa: E402
+from common.ons_csv import (  # noqa: E402
+    PARSER_ENGINE, clean_codes, compact_ons_frame, parse_instants, read_ons_csv,
+)
+from synthetic import (  # noqa: E402
+    SYNTHETIC_VERSION, ons_file_name, synthetic_pld_csv, write_ons_month,
+)
+
+BASELINES_PATH = os.path.join(BENCH_DIR, "baselines.json")
+# arquivos gerados ficam aqui entre execuções (gerar o "grande" é lento)
+DATA_DIR = os.environ.get("BENCH_DATA_DIR", os.path.join(BENCH_DIR, "_data"))
+
+# usinas por arquivo do ONS / anos de PLD
+ONS_SIZES = {"pequeno": 300, "medio": 1500, "grande": 5000}
+PLD_SIZES = {"pequeno": 1, "medio": 4, "grande": 12}
+
+BENCH_YM = "2025-03"
+EOLICA_MONTHS = ["2025-02", "2025-03"]
+SEED = 42
+
+DEFAULT_THRESHOLD = 0.25
+# diferença absoluta mínima (s) para contar como regressão/melhora
+MIN_DELTA_S = 0.05
+MIN_BENCH_S = 1.0
+MAX_RUNS = 50
+
+
+# ------------------------------------------------------------
+# Dados
+# ------------------------------------------------------------
+def ons_file(kind: str, ym: str, n_plants: int, seed: int = SEED) -> str:
+    """CSV sintético do mês (gerado uma vez por kind/tamanho/seed)."""
+    out_dir = os.path.join(DATA_DIR, f"{kind}_{n_plants}_s{seed}_v{SYNTHETIC_VERSION}")
+    path = os.path.join(out_dir, ons_file_name(kind, ym))
+    if not os.path.exists(path):
+        print(f"  gerando {kind} {ym} com {n_plants} usinas...")
+        write_ons_month(out_dir, ym, n_plants, kind=kind, seed=seed)
+    return path
+
+
+def count_rows(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(buf.count(b"\n") for buf in iter(lambda: f.read(1 << 20), b"")) - 1
+
+
+# ------------------------------------------------------------
+# Casos: setup(tamanho) -> (estado, linhas); run(estado)
+# ------------------------------------------------------------
+def setup_solar_aggregate(size):
+    path = ons_file("solar", BENCH_YM, ONS_SIZES[size])
+    df = read_ons_csv(path, solar.READ_COLS)
+    return df, len(df)
+
+
+def run_solar_aggregate(df):
+    solar.monthly_aggregate_one_month(df, BENCH_YM)
+
+
+def setup_solar_dt_hours(size):
+    df, n = setup_solar_aggregate(size)
+    df = compact_ons_frame(df.copy(), float_cols=["val_geracaolimitada"])
+    df["nom_usina"] = clean_codes(df["nom_usina"])
+    df["din_instante"] = parse_instants(df["din_instante"])
+    return df, n
+
+
+def run_solar_dt_hours(df):
+    solar.compute_dt_hours(df, BENCH_YM)
+
+
+def setup_eolica_build_monthly(size):
+    # os meses no layout do cache do script (RESTRICAO_COFF_EOLICA_AAAA_MM.csv)
+    work = os.path.join(DATA_DIR, f"eolica_build_{ONS_SIZES[size]}_v{SYNTHETIC_VERSION}")
+    cache = os.path.join(work, "ons")
+    os.makedirs(cache, exist_ok=True)
+    rows = 0
+    for i, ym in enumerate(EOLICA_MONTHS):
+        src = ons_file("eolica", ym, ONS_SIZES[size], seed=SEED + i)
+        dest = os.path.join(cache, os.path.basename(eolica.month_csv_path(ym)))
+        if not os.path.exists(dest):
+            os.link(src, dest)
+        rows += count_rows(src)
+    return work, rows
+
+
+def run_eolica_build_monthly(work):
+    saved = (eolica.ONS_CACHE_DIR, eolica.AGG_CACHE_DIR, eolica.RAW_DIR, eolica.OUT_MONTHLY_TEST)
+    eolica.ONS_CACHE_DIR = os.path.join(work, "ons")
+    eolica.AGG_CACHE_DIR = os.path.join(work, "_agg")
+    eolica.RAW_DIR = work
+    eolica.OUT_MONTHLY_TEST = os.path.join(work, "monthly.csv")
+    # sem agregados em cache: mede o cálculo de todos os meses
+    shutil.rmtree(eolica.AGG_CACHE_DIR, ignore_errors=True)
+    try:
+        eolica.build_monthly_from_cached_csvs()
+    finally:
+        (eolica.ONS_CACHE_DIR, eolica.AGG_CACHE_DIR,
+         eolica.RAW_DIR, eolica.OUT_MONTHLY_TEST) = saved
+
+
+def setup_pld_clean(size):
+    data = synthetic_pld_csv(2025 - PLD_SIZES[size], PLD_SIZES[size], seed=SEED)
+    return data, data.count(b"\n") - 1
+
+
+def run_pld_clean(data):
+    for _ in pld.iter_clean_chunks(io.BytesIO(data), fast=True):
+        pass
+
+
+CASES = {
+    "solar_aggregate": (setup_solar_aggregate, run_solar_aggregate),
+    "solar_dt_hours": (setup_solar_dt_hours, run_solar_dt_hours),
+    "eolica_build_monthly": (setup_eolica_build_monthly, run_eolica_build_monthly),
+    "pld_clean": (setup_pld_clean, run_pld_clean),
+}
+
+
+# ------------------------------------------------------------
+# Medição e baselines
+# ------------------------------------------------------------
+def measure(case: str, size: str, repeat: int) -> dict:
+    setup, run = CASES[case]
+    state, rows = setup(size)
+    times = []
+    # casos rápidos repetem até MIN_BENCH_S para o mínimo não ser ruído
+    while len(times) < repeat or (sum(times) < MIN_BENCH_S and len(times) < MAX_RUNS):
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(state)
+        times.append(time.perf_counter() - t0)
+    best = min(times)
+    return {"seconds": round(best, 4), "rows": rows}
+
+
+def machine_meta() -> dict:
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "parser": PARSER_ENGINE,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def load_baselines(path: str) -> dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baselines(path: str, baselines: dict) -> None:
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(baselines, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks dos caminhos quentes (dados sintéticos).")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--sizes", nargs="+", choices=list(ONS_SIZES), default=["pequeno", "medio"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help=f"regressão se tempo > baseline * (1 + N) (padrão: {DEFAULT_THRESHOLD})")
+    parser.add_argument("--min-delta", type=float, default=MIN_DELTA_S,
+                        help=f"ignora diferenças abaixo de N segundos (padrão: {MIN_DELTA_S})")
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument("--record", action="store_true",
+                        help="grava os tempos medidos como novos baselines")
+    args = parser.parse_args(argv)
+
+    baselines = load_baselines(args.baselines)
+    meta = machine_meta()
+    if baselines and not args.record and baselines.get("_meta") != meta:
+        print(f"⚠️ baselines medidos em outro ambiente: {baselines.get('_meta')}")
+
+    regressions = []
+    print(f"{'caso':<22} {'tamanho':<8} {'linhas':>11} {'tempo':>9} {'linhas/s':>12} "
+          f"{'baseline':>9} {'razão':>6}")
+    for case in args.cases:
+        for size in args.sizes:
+            res = measure(case, size, args.repeat)
+            key = f"{case}/{size}"
+            base = baselines.get(key)
+            ratio = res["seconds"] / base["seconds"] if base else None
+            # abaixo do piso absoluto é ruído, qualquer que seja a razão
+            above_noise = base is not None and abs(res["seconds"] - base["seconds"]) >= args.min_delta
+
+            status = ""
+            if above_noise and ratio > 1 + args.threshold:
+                status = "REGRESSÃO"
+                regressions.append(key)
+            elif above_noise and ratio < 1 - args.threshold:
+                status = "melhorou"
+
+            base_s = f"{base['seconds']:.3f}s" if base else "-"
+            ratio_s = f"{ratio:.2f}" if ratio is not None else "-"
+            print(f"{case:<22} {size:<8} {res['rows']:>11,} {res['seconds']:>8.3f}s "
+                  f"{res['rows'] / res['seconds']:>12,.0f} {base_s:>9} {ratio_s:>6} {status}")
+            if args.record:
+                baselines[key] = res
+
+    if args.record:
+        baselines["_meta"] = meta
+        save_baselines(args.baselines, baselines)
+        print(f"\nBaselines gravados em {args.baselines}")
+        return
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} regressão(ões) acima de {args.threshold:.0%} "
+              f"(e de {args.min_delta * 1000:.0f} ms): "
+              + ", ".join(regressions))
+        sys.exit(1)
+    print(f"\n✅ Nenhuma regressão acima de {args.threshold:.0%} "
+          f"(e de {args.min_delta * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# benchmarks/bench_pld_clean.py
+#
+# Micro-benchmark da limpeza do PLD (update_pld_2025.py): caminho rápido
+# (decimal no parser + datas por aritmética inteira) vs caminho lento
+# (limpeza por strings), sobre o CSV sintético de benchmarks/synthetic.py.
+#
+# uso: python benchmarks/bench_pld_clean.py [--years N] [--repeat N]
+
+import argparse
+import io
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "pld_ccee", "src"))
+
+import update_pld_2025 as pld  # noqa: E402
+from synthetic import synthetic_pld_csv  # noqa: E402
+
+
+def run(data: bytes, fast: bool) -> tuple[float, int]:
+    t0 = time.perf_counter()
+    n = 0
+    for df2 in pld.iter_clean_chunks(io.BytesIO(data), fast=fast):
+        n += len(df2)
+    return time.perf_counter() - t0, n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da limpeza do PLD.")
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    data = synthetic_pld_csv(2025, args.years)
+    print(f"CSV sintético: {len(data) / 1e6:.1f} MB, {args.years} ano(s)")
+
+    best = {}
+    for fast in (False, True):
+        times = []
+        for _ in range(args.repeat):
+            elapsed, n = run(data, fast)
+            times.append(elapsed)
+        best[fast] = min(times)
+        label = "rápido" if fast else "lento "
+        print(f"{label}: {best[fast]:.3f}s | {n:,} linhas | {n / best[fast]:,.0f} linhas/s")
+
+    print(f"speedup: {best[False] / best[True]:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
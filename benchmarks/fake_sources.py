@@ -0,0 +1,307 @@
+# benchmarks/fake_sources.py
+#
+# Servidor HTTP local no lugar da CCEE (CKAN), do ONS (CKAN) e do bucket
+# S3 do ONS, para rodar e medir os pipelines sem rede. Serve:
+#   /ccee/api/3/action/package_show?id=pld_horario      resources pld_horario_AAAA
+#   /ccee/files/pld_horario_AAAA.csv
+#   /ons/api/3/action/package_show?id=restricao_coff_eolica_usi (ou _fotovoltaica_usi)
+#   /ons-s3/dataset/restricao_coff_eolica_tm/RESTRICAO_COFF_EOLICA_AAAA_MM.csv
+#   /ons-s3/dataset/restricao_coff_fotovoltaica_tm/RESTRICAO_COFF_FOTOVOLTAICA_AAAA_MM.csv
+# Os arquivos são os de benchmarks/synthetic.py, gerados na primeira vez
+# que alguém pede e guardados em `data_dir`. Meses de FIRST_YM até o mês
+# corrente (este só até ontem); anos do PLD de FIRST_YM até o ano corrente.
+# Respostas com ETag/Last-Modified, 304 para If-None-Match e Range
+# (bytes=a- / bytes=a-b), como o S3.
+#
+# uso: python benchmarks/fake_sources.py --port 8765 [--plants 100]
+#      (imprime os export CCEE_CKAN_BASE / ONS_CKAN_BASE / ONS_S3_BASE)
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+from datetime import date
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from synthetic import (
+    KINDS, SYNTHETIC_VERSION, ons_file_name, synthetic_pld_csv, write_ons_month,
+)
+
+FIRST_YM = "2025-01"
+
+# dataset CKAN / pasta no S3 de cada fonte
+ONS_DATASETS = {
+    "eolica": ("restricao_coff_eolica_usi", "restricao_coff_eolica_tm", "Restricoes_coff_eolicas"),
+    "solar": ("restricao_coff_fotovoltaica_usi", "restricao_coff_fotovoltaica_tm",
+              "Restricoes_coff_fotovoltaicas"),
+}
+PLD_DATASET = "pld_horario"
+
+CHUNK_BYTES = 1024 * 1024
+
+
+def months(first_ym: str, today: date) -> list:
+    y, m = map(int, first_ym.split("-"))
+    out = []
+    while (y, m) <= (today.year, today.month):
+        out.append(f"{y:04d}-{m:02d}")
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return out
+
+
+class FakeSources:
+    """Arquivos sintéticos + contadores do que foi servido."""
+
+    def __init__(self, data_dir: str, plants: int = 100, days: int | None = None,
+                 seed: int = 42, today: date | None = None):
+        self.plants = plants
+        self.days = days
+        self.seed = seed
+        self.today = today or date.today()
+        self.data_dir = os.path.join(
+            data_dir, f"fontes_{plants}p_{days or 'mes'}d_s{seed}_v{SYNTHETIC_VERSION}"
+        )
+        self._gen_lock = threading.Lock()
+        self._meta = {}  # caminho -> (etag, tamanho, linhas, mtime)
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    # -------------------- arquivos --------------------
+    def ons_months(self) -> list:
+        return months(FIRST_YM, self.today)
+
+    def pld_years(self) -> list:
+        return list(range(int(FIRST_YM[:4]), self.today.year + 1))
+
+    def _ons_path(self, kind: str, ym: str) -> str | None:
+        if ym not in self.ons_months():
+            return None
+        path = os.path.join(self.data_dir, kind, ons_file_name(kind, ym))
+        if not os.path.exists(path):
+            # mês corrente vai só até ontem, como no ONS
+            current = ym == self.ons_months()[-1]
+            days = max(self.today.day - 1, 1) if current else None
+            if self.days:
+                days = min(days or self.days, self.days)
+            seed = self.seed + int(ym.replace("-", ""))
+            write_ons_month(os.path.dirname(path), ym, self.plants, kind=kind,
+                            days=days, seed=seed)
+        return path
+
+    def _pld_path(self, year: int) -> str | None:
+        if year not in self.pld_years():
+            return None
+        path = os.path.join(self.data_dir, "pld", f"pld_horario_{year}.csv")
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                f.write(synthetic_pld_csv(year, 1, seed=self.seed + year))
+            os.replace(path + ".tmp", path)
+        return path
+
+    def file_for(self, path: str) -> str | None:
+        """Caminho da URL -> arquivo local (gerado se preciso), ou None."""
+        m = re.fullmatch(r"/ccee/files/pld_horario_(\d{4})\.csv", path)
+        if m:
+            with self._gen_lock:
+                return self._pld_path(int(m.group(1)))
+        for kind, (_, folder, _) in ONS_DATASETS.items():
+            m = re.fullmatch(rf"/ons-s3/dataset/{folder}/{KINDS[kind][1]}_(\d{{4}})_(\d{{2}})\.csv", path)
+            if m:
+                with self._gen_lock:
+                    return self._ons_path(kind, f"{m.group(1)}-{m.group(2)}")
+        return None
+
+    def meta(self, local: str) -> tuple:
+        """(etag, tamanho, linhas, last-modified) do arquivo, calculados uma vez."""
+        mtime = os.path.getmtime(local)
+        cached = self._meta.get(local)
+        if cached and cached[3] == mtime:
+            return cached
+        h = hashlib.md5()
+        rows = -1  # cabeçalho
+        with open(local, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_BYTES), b""):
+                h.update(chunk)
+                rows += chunk.count(b"\n")
+        meta = (f'"{h.hexdigest()}"', os.path.getsize(local), rows, mtime)
+        self._meta[local] = meta
+        return meta
+
+    def generate_all(self) -> None:
+        """Gera tudo de antemão (para a geração não entrar na medição)."""
+        for year in self.pld_years():
+            self.meta(self.file_for(f"/ccee/files/pld_horario_{year}.csv"))
+        for kind, (_, folder, _) in ONS_DATASETS.items():
+            for ym in self.ons_months():
+                name = ons_file_name(kind, ym)
+                self.meta(self.file_for(f"/ons-s3/dataset/{folder}/{name}"))
+
+    # -------------------- package_show --------------------
+    def package(self, base_url: str, source: str, dataset: str) -> dict | None:
+        if source == "ccee" and dataset == PLD_DATASET:
+            resources = [
+                {"name": f"pld_horario_{y}", "format": "CSV",
+                 "url": f"{base_url}/ccee/files/pld_horario_{y}.csv"}
+                for y in self.pld_years()
+            ]
+        elif source == "ons":
+            match = [(k, v) for k, v in ONS_DATASETS.items() if v[0] == dataset]
+            if not match:
+                return None
+            kind, (_, folder, label) = match[0]
+            resources = [
+                {"name": f"{label}-{ym}", "format": "CSV",
+                 "url": f"{base_url}/ons-s3/dataset/{folder}/{ons_file_name(kind, ym)}"}
+                for ym in self.ons_months()
+            ]
+        else:
+            return None
+        return {"name": dataset, "resources": resources}
+
+    # -------------------- contadores --------------------
+    def reset_stats(self) -> dict:
+        """Zera os contadores e devolve os acumulados até aqui."""
+        with self._stats_lock:
+            old = getattr(self, "_stats", None)
+            self._stats = {"requests": 0, "bytes": 0, "status": {}, "files": {}}
+        return old
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return json.loads(json.dumps(self._stats))
+
+    def count(self, status: int, nbytes: int = 0, local: str | None = None,
+              rows: int = 0) -> None:
+        with self._stats_lock:
+            s = self._stats
+            s["requests"] += 1
+            s["bytes"] += nbytes
+            s["status"][str(status)] = s["status"].get(str(status), 0) + 1
+            if local:
+                s["files"][local] = rows
+
+    # -------------------- servidor --------------------
+    def serve(self, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+        """Sobe o servidor numa thread; a URL base fica em server.base_url."""
+        server = ThreadingHTTPServer((host, port), _Handler)
+        server.daemon_threads = True
+        server.sources = self
+        server.base_url = f"http://{host}:{server.server_address[1]}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, como os hosts reais
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def sources(self) -> FakeSources:
+        return self.server.sources
+
+    def _send(self, status: int, body: bytes = b"", headers=(), local=None, rows=0):
+        self.send_response(status)
+        for k, v in headers:
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+        self.sources.count(status, len(body) if self.command != "HEAD" else 0, local, rows)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        m = re.fullmatch(r"/(ccee|ons)/api/3/action/package_show", url.path)
+        if m:
+            dataset = parse_qs(url.query).get("id", [""])[0]
+            pkg = self.sources.package(self.server.base_url, m.group(1), dataset)
+            if pkg is None:
+                body = json.dumps({"success": False, "error": {"message": "Not found"}})
+                return self._send(404, body.encode(), [("Content-Type", "application/json")])
+            body = json.dumps({"success": True, "result": pkg}).encode()
+            return self._send(200, body, [("Content-Type", "application/json")])
+
+        local = self.sources.file_for(url.path)
+        if local is None:
+            return self._send(404, b"Not Found")
+        self._send_file(local)
+
+    def _send_file(self, local: str):
+        etag, size, rows, mtime = self.sources.meta(local)
+        base = [("ETag", etag), ("Last-Modified", formatdate(mtime, usegmt=True)),
+                ("Accept-Ranges", "bytes"), ("Content-Type", "text/csv")]
+
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", base, local, rows)
+
+        start, end, status = 0, size - 1, 200
+        rng = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range") or "")
+        if rng:
+            start = int(rng.group(1))
+            end = min(int(rng.group(2)), size - 1) if rng.group(2) else size - 1
+            if start >= size or start > end:
+                return self._send(416, b"", [("Content-Range", f"bytes */{size}")], local, rows)
+            status = 206
+            base.append(("Content-Range", f"bytes {start}-{end}/{size}"))
+
+        length = end - start + 1
+        self.send_response(status)
+        for k, v in base:
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(length))
+        self.end_headers()
+        sent = 0
+        if self.command != "HEAD":
+            with open(local, "rb") as f:
+                f.seek(start)
+                while sent < length:
+                    chunk = f.read(min(CHUNK_BYTES, length - sent))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    sent += len(chunk)
+        self.sources.count(status, sent, local, rows)
+
+
+def env_for(base_url: str) -> dict:
+    """Variáveis que apontam os scripts para o servidor local."""
+    return {
+        "CCEE_CKAN_BASE": f"{base_url}/ccee",
+        "ONS_CKAN_BASE": f"{base_url}/ons",
+        "ONS_S3_BASE": f"{base_url}/ons-s3",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CKAN/S3 locais com dados sintéticos.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--plants", type=int, default=100, help="usinas por arquivo do ONS")
+    parser.add_argument("--days", type=int, default=None, help="dias por mês (padrão: mês inteiro)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "_data"))
+    args = parser.parse_args()
+
+    sources = FakeSources(args.data, plants=args.plants, days=args.days, seed=args.seed)
+    server = sources.serve(args.host, args.port)
+    print(f"Servindo em {server.base_url} (arquivos em {sources.data_dir})")
+    for k, v in env_for(server.base_url).items():
+        print(f"export {k}={v}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+# benchmarks/synthetic.py
+#
+# Dados sintéticos no formato das fontes reais, para benchmarks e testes
+# locais sem rede:
+#   - restrição COFF do ONS (eólica/solar): mesmas 16 colunas, ';', uma
+#     linha por usina a cada 30 min, em ordem de usina; ~2/3 das linhas sem
+#     restrição (limitação, origem e descrição vazias), ENE/CNF/REL em
+#     blocos de horas, referenciafinal vazia em metade das usinas,
+#     alguns val_geracao vazios e alguns intervalos faltando;
+#   - PLD horário da CCEE: ';' e vírgula decimal.
+#
+# uso: python benchmarks/synthetic.py ons --kind eolica --plants 1500 --months 2025-01 2025-02 --out DIR
+#      python benchmarks/synthetic.py pld --first-year 2024 --years 2 --out DIR
+
+import argparse
+import calendar
+import io
+import os
+import random
+
+import numpy as np
+import pandas as pd
+
+# muda quando os dados gerados mudam (invalida arquivos já gerados)
+SYNTHETIC_VERSION = 2
+
+ONS_COLUMNS = [
+    "id_subsistema", "nom_subsistema", "id_estado", "nom_estado", "nom_usina",
+    "id_ons", "ceg", "din_instante", "val_geracao", "val_geracaolimitada",
+    "val_disponibilidade", "val_geracaoreferencia", "val_geracaoreferenciafinal",
+    "cod_razaorestricao", "cod_origemrestricao", "dsc_restricao",
+]
+
+# subsistema -> (nome, estados)
+SUBSISTEMAS = {
+    "NE": ("NORDESTE", [("BA", "BAHIA"), ("RN", "RIO GRANDE DO NORTE"), ("CE", "CEARÁ"),
+                        ("PI", "PIAUÍ"), ("PE", "PERNAMBUCO")]),
+    "SE": ("SUDESTE/CENTRO-OESTE", [("MG", "MINAS GERAIS"), ("SP", "SÃO PAULO")]),
+    "S": ("SUL", [("RS", "RIO GRANDE DO SUL")]),
+    "N": ("NORTE", [("MA", "MARANHÃO")]),
+}
+
+# por fonte: prefixo do nome, arquivo, peso de cada subsistema
+KINDS = {
+    "eolica": ("EOL", "RESTRICAO_COFF_EOLICA", {"NE": 0.80, "S": 0.10, "SE": 0.07, "N": 0.03}),
+    "solar": ("UFV", "RESTRICAO_COFF_FOTOVOLTAICA", {"NE": 0.60, "SE": 0.40}),
+}
+
+# razão -> (peso por bloco, origem, descrição); "" = sem restrição
+RAZOES = {
+    "": (0.67, "", ""),
+    "ENE": (0.30, "SIS", "Razão energética."),
+    "CNF": (0.02, "LOC", "Controle de frequência do SIN."),
+    "REL": (0.01, "SIS", "Restrição por confiabilidade elétrica."),
+}
+
+# restrições valem em blocos de 4 h (8 intervalos)
+BLOCK_STEPS = 8
+
+WORDS_A = ["VENTOS", "SERRA", "CATAVENTOS", "LAGOA", "CHAPADA", "MORRO", "SÃO", "BOA",
+           "PEDRA", "CAMPO", "RIO", "SANTA", "ALTO", "BRISA", "SOL", "DUNAS"]
+WORDS_B = ["ACARAÚ", "DO AÇU", "DA BAHIA", "NOVA", "DOURADA", "DOS VENTOS", "BRANCA",
+           "DO PIAUÍ", "GRANDE", "DE MINAS", "DO NORTE", "VERDE", "REAL", "DO SUL"]
+ROMAN = ["I", "II", "III", "IV", "V", "VI", "VII", "VIII", "IX", "X"]
+
+SUBMERCADOS = ["SUDESTE", "SUL", "NORDESTE", "NORTE"]
+
+
+def plant_names(n_plants: int, kind: str = "eolica") -> list:
+    """Nomes distintos no estilo do ONS ('EOL SERRA DO AÇU III')."""
+    prefix = KINDS[kind][0]
+    na, nb, nr = len(WORDS_A), len(WORDS_B), len(ROMAN)
+    names = []
+    for i in range(n_plants):
+        a, b, r = WORDS_A[i % na], WORDS_B[(i // na) % nb], ROMAN[(i // (na * nb)) % nr]
+        cycle = i // (na * nb * nr)
+        names.append(f"{prefix} {a} {b} {r}" + (f" {cycle + 1}" if cycle else ""))
+    return names
+
+
+def synthetic_ons_frame(ym: str, n_plants: int, kind: str = "eolica", days: int | None = None,
+                        gap_frac: float = 0.002, seed: int = 42) -> pd.DataFrame:
+    """Um mês de restrição do ONS, já com as colunas em texto/float como no CSV."""
+    rng = np.random.default_rng(seed)
+    prefix, _, sub_weights = KINDS[kind]
+    start = pd.Timestamp(f"{ym}-01")
+    steps = (days or start.days_in_month) * 48
+    instants = pd.date_range(start, periods=steps, freq="30min")
+
+    # usinas: subsistema/estado, capacidade e fator próprio
+    subs = list(sub_weights)
+    sub_idx = rng.choice(len(subs), size=n_plants, p=list(sub_weights.values()))
+    cap = rng.uniform(20, 400, n_plants)
+    factor = rng.uniform(0.5, 1.0, n_plants)
+
+    hour = (instants.hour + instants.minute / 60).to_numpy()
+    if kind == "solar":
+        shape = np.clip(np.sin((hour - 6) / 12 * np.pi), 0, None)
+    else:
+        shape = 0.45 + 0.25 * np.sin(hour / 24 * 2 * np.pi + 1.0)
+    noise = 1 + 0.1 * rng.standard_normal((n_plants, steps))
+    ref = np.clip((cap * factor)[:, None] * shape[None, :] * noise, 0, None)
+
+    # razão por bloco de 4 h
+    razoes = list(RAZOES)
+    n_blocks = -(-steps // BLOCK_STEPS)
+    blocks = rng.choice(len(razoes), size=(n_plants, n_blocks),
+                        p=[RAZOES[r][0] for r in razoes])
+    razao = np.repeat(blocks, BLOCK_STEPS, axis=1)[:, :steps]
+    restricted = razao > 0
+
+    limitada = np.where(restricted, ref * rng.uniform(0.3, 0.9, ref.shape), np.nan)
+    final = np.where((np.arange(n_plants) % 2 == 0)[:, None], ref, np.nan)
+    geracao = np.where(restricted, np.minimum(ref, limitada),
+                       ref * rng.uniform(0.95, 1.0, ref.shape))
+
+    plant = np.repeat(np.arange(n_plants), steps)
+    flat_razao = razao.ravel()
+    df = pd.DataFrame({
+        "_plant": plant,
+        "_step": np.tile(np.arange(steps), n_plants),
+        "val_geracao": geracao.ravel().round(3),
+        "val_geracaolimitada": limitada.ravel().round(3),
+        "val_disponibilidade": np.repeat(cap.round(3), steps),
+        "val_geracaoreferencia": ref.ravel().round(3),
+        "val_geracaoreferenciafinal": final.ravel().round(3),
+        "_razao": flat_razao,
+    })
+
+    # intervalos faltando e val_geracao vazio, como nos arquivos reais
+    if gap_frac:
+        df = df[rng.random(len(df)) >= gap_frac]
+    df.loc[rng.random(len(df)) < 0.001, "val_geracao"] = np.nan
+
+    names = np.array(plant_names(n_plants, kind), dtype=object)
+    estados = [SUBSISTEMAS[subs[s]][1][i % len(SUBSISTEMAS[subs[s]][1])]
+               for i, s in enumerate(sub_idx)]
+    p = df["_plant"].to_numpy()
+    r = df["_razao"].to_numpy()
+    fmt = instants.strftime("%Y-%m-%d %H:%M:%S").to_numpy(dtype=object)
+
+    out = pd.DataFrame({
+        "id_subsistema": np.array(subs, dtype=object)[sub_idx][p],
+        "nom_subsistema": np.array([SUBSISTEMAS[s][0] for s in subs], dtype=object)[sub_idx][p],
+        "id_estado": np.array([e[0] for e in estados], dtype=object)[p],
+        "nom_estado": np.array([e[1] for e in estados], dtype=object)[p],
+        "nom_usina": names[p],
+        "id_ons": np.array([f"{prefix[0]}{subs[s]}{i:05d}" for i, s in enumerate(sub_idx)],
+                           dtype=object)[p],
+        "ceg": "-",
+        "din_instante": fmt[df["_step"].to_numpy()],
+        "val_geracao": df["val_geracao"].to_numpy(),
+        "val_geracaolimitada": df["val_geracaolimitada"].to_numpy(),
+        "val_disponibilidade": df["val_disponibilidade"].to_numpy(),
+        "val_geracaoreferencia": df["val_geracaoreferencia"].to_numpy(),
+        "val_geracaoreferenciafinal": df["val_geracaoreferenciafinal"].to_numpy(),
+        "cod_razaorestricao": np.array(razoes, dtype=object)[r],
+        "cod_origemrestricao": np.array([RAZOES[z][1] for z in razoes], dtype=object)[r],
+        "dsc_restricao": np.array([RAZOES[z][2] for z in razoes], dtype=object)[r],
+    })
+    return out[ONS_COLUMNS]
+
+
+def ons_file_name(kind: str, ym: str) -> str:
+    yyyy, mm = ym.split("-")
+    return f"{KINDS[kind][1]}_{yyyy}_{mm}.csv"
+
+
+def write_ons_month(out_dir: str, ym: str, n_plants: int, kind: str = "eolica",
+                    **kwargs) -> str:
+    """Grava o mês em `out_dir` com o nome de arquivo do ONS; devolve o caminho."""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, ons_file_name(kind, ym))
+    df = synthetic_ons_frame(ym, n_plants, kind=kind, **kwargs)
+    tmp = path + ".tmp"
+    df.to_csv(tmp, sep=";", index=False, na_rep="")
+    os.replace(tmp, path)
+    return path
+
+
+def synthetic_pld_csv(first_year: int, n_years: int, seed: int = 42) -> bytes:
+    """CSV no layout da CCEE: ';' e vírgula decimal, 1 linha por hora/submercado."""
+    rnd = random.Random(seed)
+    out = io.StringIO()
+    out.write("MES_REFERENCIA;SUBMERCADO;DIA;HORA;PLD_HORA\n")
+    for year in range(first_year, first_year + n_years):
+        for month in range(1, 13):
+            for day in range(1, calendar.monthrange(year, month)[1] + 1):
+                for hour in range(24):
+                    for sub in SUBMERCADOS:
+                        v = f"{rnd.uniform(60, 1500):.2f}".replace(".", ",")
+                        out.write(f"{year}{month:02d};{sub};{day};{hour};{v}\n")
+    return out.getvalue().encode("utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera arquivos sintéticos do ONS / CCEE.")
+    sub = parser.add_subparsers(dest="what", required=True)
+
+    ons = sub.add_parser("ons", help="restrição COFF do ONS (um CSV por mês)")
+    ons.add_argument("--kind", choices=list(KINDS), default="eolica")
+    ons.add_argument("--plants", type=int, default=300)
+    ons.add_argument("--months", nargs="+", required=True, help="AAAA-MM ...")
+    ons.add_argument("--days", type=int, default=None, help="dias por mês (padrão: mês inteiro)")
+    ons.add_argument("--seed", type=int, default=42)
+    ons.add_argument("--out", required=True)
+
+    pld = sub.add_parser("pld", help="PLD horário da CCEE (um CSV por ano)")
+    pld.add_argument("--first-year", type=int, default=2025)
+    pld.add_argument("--years", type=int, default=1)
+    pld.add_argument("--seed", type=int, default=42)
+    pld.add_argument("--out", required=True)
+
+    args = parser.parse_args()
+    if args.what == "ons":
+        for i, ym in enumerate(args.months):
+            path = write_ons_month(args.out, ym, args.plants, kind=args.kind,
+                                   days=args.days, seed=args.seed + i)
+            print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB")
+    else:
+        os.makedirs(args.out, exist_ok=True)
+        for i in range(args.years):
+            year = args.first_year + i
+            path = os.path.join(args.out, f"pld_horario_{year}.csv")
+            with open(path, "wb") as f:
+                f.write(synthetic_pld_csv(year, 1, seed=args.seed + i))
+            print(f"{path}: {os.path.getsize(path) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
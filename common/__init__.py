@@ -0,0 +1,2 @@
+# common/
+# Helpers compartilhados pelos scripts do PLD (CCEE) e do COFF (ONS).
@@ -0,0 +1,148 @@
+# common/ckan.py
+#
+# Metadados CKAN (package_show) da CCEE e do ONS. Um package_show por
+# dataset por execução (memo em memória, sessão keep-alive compartilhada)
+# e cache em disco com TTL: dentro do TTL nem há request; depois dele o
+# pedido é condicional (ETag/Last-Modified, quando o servidor manda). Se
+# o CKAN falhar, a última cópia em disco é usada. Os resources voltam já
+# indexados por nome, por ano e por ano-mês.
+
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+
+from common.http import shared_session
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CKAN_CACHE_DIR = os.environ.get(
+    "CKAN_CACHE_DIR", os.path.join(REPO_DIR, "dashboard", "data", "raw", "_cache", "ckan")
+)
+CKAN_TTL_S = 3600
+
+# ano-mês no nome do resource quando o dataset não tem padrão próprio
+YM_PATTERN = r"(\d{4})[-_](\d{2})(?!\d)"
+
+_memo = {}
+_memo_lock = threading.Lock()
+
+
+def _cache_path(base_url: str, dataset: str) -> str:
+    host = urlparse(base_url).netloc.replace(":", "_")
+    return os.path.join(CKAN_CACHE_DIR, f"{host}__{dataset}.json")
+
+
+def _load_disk(path: str) -> dict | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save_disk(path: str, entry: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def _fetch_package(base_url: str, dataset: str, ttl_s: float,
+                   session: requests.Session) -> dict:
+    path = _cache_path(base_url, dataset)
+    cached = _load_disk(path)
+    if cached and time.time() - cached["fetched_at"] < ttl_s:
+        return cached["package"]
+
+    headers = {}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    url = f"{base_url.rstrip('/')}/api/3/action/package_show"
+    try:
+        r = session.get(url, params={"id": dataset}, headers=headers, timeout=60)
+        if r.status_code == 304 and cached:
+            cached["fetched_at"] = time.time()
+            _save_disk(path, cached)
+            return cached["package"]
+        r.raise_for_status()
+        data = r.json()
+        if not data.get("success"):
+            raise RuntimeError(f"CKAN success=false: {data}")
+    except (requests.RequestException, ValueError, RuntimeError) as e:
+        if cached:
+            print(f"⚠️ CKAN {dataset}: {e}; usando metadados em cache")
+            return cached["package"]
+        raise
+
+    _save_disk(path, {
+        "fetched_at": time.time(),
+        "etag": r.headers.get("ETag"),
+        "last_modified": r.headers.get("Last-Modified"),
+        "package": data["result"],
+    })
+    return data["result"]
+
+
+def package_show(base_url: str, dataset: str, ttl_s: float = CKAN_TTL_S,
+                 session: requests.Session | None = None) -> dict:
+    """`result` do package_show; no máximo um request por dataset por execução."""
+    key = (base_url.rstrip("/"), dataset)
+    with _memo_lock:
+        if key in _memo:
+            return _memo[key]
+    pkg = _fetch_package(base_url, dataset, ttl_s, session or shared_session())
+    with _memo_lock:
+        return _memo.setdefault(key, pkg)
+
+
+def resource_format(res: dict) -> str:
+    # URL .csv conta como csv mesmo com o campo format vazio ou diferente
+    url = (res.get("url") or "").strip()
+    if url.lower().endswith(".csv"):
+        return "csv"
+    fmt = (res.get("format") or "").strip().lower()
+    if fmt:
+        return fmt
+    return os.path.splitext(urlparse(url).path)[1].lstrip(".").lower()
+
+
+def index_resources(pkg: dict, pattern: str | None = None) -> dict:
+    """{"by_name": {nome minúsculo: res},
+        "by_year": {ano: {formato: res}},
+        "by_ym": {"AAAA-MM": {formato: res}}}
+
+    Ano e mês saem do nome do resource (ex.: "..._2025", "...-2025-03").
+    `pattern` é o padrão de nome dos resources mensais do dataset (grupos
+    ano e mês, sem diferenciar maiúsculas), ex. na eólica do ONS
+    r"Restricoes?_coff_eolicas-(\d{4})-(\d{2})"; sem ele vale YM_PATTERN.
+    Resource sem URL fica de fora.
+    """
+    by_name, by_year, by_ym = {}, {}, {}
+    for res in pkg.get("resources", []):
+        name = (res.get("name") or "").strip()
+        if not (res.get("url") or "").strip():
+            continue
+        by_name[name.lower()] = res
+        fmt = resource_format(res)
+
+        m = re.search(pattern or YM_PATTERN, name, flags=re.IGNORECASE)
+        if m and 1 <= int(m.group(2)) <= 12:
+            by_ym.setdefault(f"{m.group(1)}-{m.group(2)}", {})[fmt] = res
+            continue
+        m = re.search(r"(?<!\d)(\d{4})$", name)
+        if m:
+            by_year.setdefault(int(m.group(1)), {})[fmt] = res
+    return {"by_name": by_name, "by_year": by_year, "by_ym": by_ym}
+
+
+def resource_map(base_url: str, dataset: str, pattern: str | None = None,
+                 **kwargs) -> dict:
+    """index_resources(package_show(...), pattern)."""
+    return index_resources(package_show(base_url, dataset, **kwargs), pattern)
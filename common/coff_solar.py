@@ -0,0 +1,397 @@
+# common/coff_solar.py
+#
+# Monthly de COFF solar (ONS, restricao_coff_fotovoltaica_tm): download dos
+# meses, agregado por usina/razão, --incremental do mês corrente e gravação
+# no store. Os scripts update_coff_solar_monthly_v3.py (oficial) e
+# update_coff_solar_monthly_test.py só diferem em onde gravam (CSV de
+# saída, pasta dos brutos e tabela do store) e chamam run_monthly().
+
+import argparse
+import contextlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import partial
+from multiprocessing import get_context
+
+import pandas as pd
+
+from common.coff_store import (
+    bootstrap_from_csv, connect_store, export_if_changed, upsert_months,
+)
+from common.http import shared_session
+from common.intervals import cadence_hours, interval_gaps, interval_hours
+from common.ons_csv import (
+    clean_codes, compact_ons_frame, parse_instants, read_ons_csv,
+)
+from common.raw_cache import fetch_to
+from common.tail import tail_csv
+
+# ONS_S3_BASE troca o host (ex.: servidor local de benchmarks/fake_sources.py)
+ONS_S3_BASE = os.environ.get("ONS_S3_BASE", "https://ons-aws-prod-opendata.s3.amazonaws.com")
+BASE_URL = f"{ONS_S3_BASE}/dataset/restricao_coff_fotovoltaica_tm"
+
+START_YM = "2025-01"
+
+# ONS revisa os meses recentes: estes são sempre rebaixados; os mais
+# antigos, se já estiverem na pasta dos brutos, são lidos do disco
+REVISION_MONTHS = 2
+
+# --incremental: estado do tail do mês corrente, dentro da pasta dos brutos
+TAIL_SUBDIR = "_tail"
+
+# chave das somas do mês e da tabela no store
+STORE_KEYS = ["nom_usina", "cod_razaorestricao"]
+OUT_COLS = ["mes", "nom_usina", "cod_razaorestricao",
+            "curtailment_mwh", "generation_mwh", "pct_curtail", "last_instante"]
+
+# colunas usadas do CSV do ONS (o resto nem é parseado)
+READ_COLS = [
+    "din_instante", "nom_usina", "cod_razaorestricao",
+    "val_geracao", "val_geracaolimitada", "val_geracaoreferencia",
+]
+
+# -------------------------------
+# helpers
+# -------------------------------
+def yms_between(start_ym: str, end_ym: str):
+    ys, ms = map(int, start_ym.split("-"))
+    ye, me = map(int, end_ym.split("-"))
+    y, m = ys, ms
+    while (y < ye) or (y == ye and m <= me):
+        yield f"{y:04d}-{m:02d}"
+        m += 1
+        if m == 13:
+            m = 1
+            y += 1
+
+def build_url(ym: str) -> str:
+    y, m = ym.split("-")
+    return f"{BASE_URL}/RESTRICAO_COFF_FOTOVOLTAICA_{y}_{m}.csv"
+
+def local_path(raw_dir: str, ym: str) -> str:
+    return os.path.join(raw_dir, f"RESTRICAO_COFF_FOTOVOLTAICA_{ym.replace('-', '_')}.csv")
+
+def download_month(raw_dir: str, ym: str, session, refresh: bool) -> str:
+    """Caminho do CSV do mês em `raw_dir`, baixando só se preciso.
+
+    Mês fora da janela de revisão que já está no disco não é rebaixado.
+    Os outros passam pelo raw_cache (GET condicional: sem mudança no
+    servidor, nada é baixado). O arquivo fica byte a byte como veio do ONS.
+    """
+    local = local_path(raw_dir, ym)
+    if os.path.exists(local) and not refresh:
+        return local
+    try:
+        res = fetch_to(session, build_url(ym), local)
+    except RuntimeError:
+        if os.path.exists(local):
+            print(f"[CACHE] {ym}: falha no download, usando a cópia local")
+            return local
+        raise
+    if res["status"] == "baixado":
+        print(f"[DL] {ym}: {res['bytes'] / 1e6:.1f} MB em {res['seconds']:.1f}s")
+    else:
+        print(f"[CACHE] {ym}: {res['status']}")
+    return local
+
+def month_end(ym: str) -> pd.Timestamp:
+    return pd.Timestamp(f"{ym}-01") + pd.offsets.MonthBegin(1)
+
+def compute_dt_hours(df: pd.DataFrame, ym: str) -> pd.Series:
+    # duração por usina; a última linha de cada usina fecha na virada do mês
+    return interval_hours(df, period_end=month_end(ym))
+
+# -------------------------------
+# core aggregation
+# -------------------------------
+def prepare_rows(df: pd.DataFrame, ym: str) -> pd.DataFrame:
+    # códigos em category; só a limitação (usada como máscara) vai a float32
+    df = compact_ons_frame(df.copy(), float_cols=["val_geracaolimitada"], label=ym)
+    df["nom_usina"] = clean_codes(df["nom_usina"])
+    df["cod_razaorestricao"] = clean_codes(df["cod_razaorestricao"], upper=True)
+
+    # converte tempo
+    df["din_instante"] = parse_instants(df["din_instante"])
+
+    # colunas numéricas
+    df["val_geracao"] = pd.to_numeric(df["val_geracao"], errors="coerce").fillna(0)
+    df["val_geracaolimitada"] = pd.to_numeric(df["val_geracaolimitada"], errors="coerce")
+
+    # referência: usa a MESMA lógica da sua planilha
+    # (se quiser trocar, é só mudar aqui)
+    ref_col = "val_geracaoreferencia"
+    df[ref_col] = pd.to_numeric(df[ref_col], errors="coerce").fillna(0)
+    return df
+
+def add_energy(df: pd.DataFrame) -> None:
+    # ============================
+    # CORTE (IGUAL AO EÓLICO)
+    # só há corte se existir limitação
+    # ============================
+    has_limit = df["val_geracaolimitada"].notna()
+
+    corte_mw = (df["val_geracaoreferencia"] - df["val_geracao"]).clip(lower=0)
+
+    df["curtailment_mwh"] = (corte_mw.where(has_limit, 0)) * df["dt_h"]
+    df["generation_mwh"]  = df["val_geracaoreferencia"] * df["dt_h"]
+
+def month_rows(df: pd.DataFrame, ym: str) -> pd.DataFrame:
+    """CSV do mês -> linhas com dt_h, curtailment_mwh e generation_mwh."""
+    df = prepare_rows(df, ym)
+
+    # delta t
+    df["dt_h"] = compute_dt_hours(df, ym)
+    add_energy(df)
+    return df
+
+def group_rows(df: pd.DataFrame) -> pd.DataFrame:
+    # agrega IGUAL ao eólico
+    return (
+        df.groupby(["nom_usina", "cod_razaorestricao"], observed=True)
+          .agg(
+              curtailment_mwh=("curtailment_mwh", "sum"),
+              generation_mwh=("generation_mwh", "sum"),
+          )
+          .reset_index()
+    )
+
+def finish_aggregate(g: pd.DataFrame, ym: str, last_inst) -> pd.DataFrame:
+    # last instante do mês
+    if pd.isna(last_inst):
+        last_inst_str = ""
+    else:
+        last_inst = pd.to_datetime(last_inst, errors="coerce")
+        last_inst_str = "" if pd.isna(last_inst) else last_inst.strftime("%Y-%m-%d %H:%M:%S")
+
+    g = g.copy()
+    g["mes"] = ym
+    g["last_instante"] = last_inst_str
+    g["pct_curtail"] = g.apply(
+        lambda r: (r["curtailment_mwh"] / r["generation_mwh"])
+        if r["generation_mwh"] > 0 else 0,
+        axis=1
+    )
+
+    g["nom_usina"] = g["nom_usina"].astype(str)
+    g["cod_razaorestricao"] = g["cod_razaorestricao"].astype(str)
+
+    return g[OUT_COLS]
+
+def monthly_aggregate_one_month(df: pd.DataFrame, ym: str) -> pd.DataFrame:
+    df = month_rows(df, ym)
+    return finish_aggregate(group_rows(df), ym, df["din_instante"].max())
+
+# -------------------------------
+# --incremental: mês corrente só com as linhas novas (common/tail.py)
+# -------------------------------
+# o dt_h de uma linha depende da próxima linha da usina e da cadência
+# (mediana das diferenças válidas) dela; o estado guarda, além das somas,
+# a última linha somada de cada usina com o que ela contribuiu, a
+# cadência e quantas diferenças ficam abaixo/iguais/acima dela
+CARRY_COLS = [
+    "nom_usina", "cod_razaorestricao", "din_instante", "val_geracao",
+    "val_geracaolimitada", "val_geracaoreferencia",
+    "curtailment_mwh", "generation_mwh", "gap_h",
+]
+
+def _records(df: pd.DataFrame) -> list:
+    out = df.astype({"nom_usina": str, "cod_razaorestricao": str}).astype(object)
+    return out.where(out.notna(), None).to_dict("records")
+
+def _last_rows(rows: pd.DataFrame) -> pd.DataFrame:
+    # mesma ordem do interval_hours: instante, empate pela ordem do arquivo
+    last = (
+        rows.sort_values("din_instante", kind="stable", na_position="first")
+            .groupby("nom_usina", observed=True).tail(1)
+    )
+    return last[CARRY_COLS].astype({"din_instante": str})
+
+def _gap_counts(gaps: pd.Series, plants: pd.Series, cadence: pd.Series) -> pd.DataFrame:
+    plants = plants.astype(str)
+    cad = plants.map(cadence)
+    counts = pd.DataFrame({"lt": gaps < cad, "eq": gaps == cad, "gt": gaps > cad})
+    return counts.groupby(plants).sum()
+
+def _state(agg, carry, cadence, counts, last_inst) -> dict:
+    return {
+        "agg": _records(agg),
+        "carry": _records(carry),
+        "cadence": {str(k): float(v) for k, v in cadence.items()},
+        "gap_counts": {str(k): [int(x) for x in v] for k, v in counts.iterrows()},
+        "last_instante": str(last_inst),
+    }
+
+def tail_state(rows: pd.DataFrame, ym: str) -> dict:
+    """Estado do tail a partir das linhas do mês inteiro (month_rows)."""
+    gaps = interval_gaps(rows, period_end=month_end(ym))
+    cadence = cadence_hours(gaps, rows["nom_usina"])
+    rows = rows.assign(gap_h=gaps)
+    return _state(group_rows(rows), _last_rows(rows), cadence,
+                  _gap_counts(gaps, rows["nom_usina"], cadence),
+                  rows["din_instante"].max())
+
+def fold_month(delta_path: str, state: dict, ym: str):
+    """Soma as linhas novas ao estado do tail; None quando o mês precisa
+    ser recalculado inteiro.
+
+    Das linhas já somadas, só a última de cada usina muda de dt_h (a
+    diferença dela deixa de ir até a virada do mês), desde que a cadência
+    não mude: a mediana continua a mesma enquanto nem as diferenças
+    menores nem as maiores que ela passam da metade.
+    """
+    new = prepare_rows(read_ons_csv(delta_path, READ_COLS), ym)
+    new = new.astype({"nom_usina": str, "cod_razaorestricao": str})
+    carry = pd.DataFrame(state["carry"], columns=CARRY_COLS)
+    carry = carry.astype({c: float for c in CARRY_COLS[3:]})
+    carry["din_instante"] = pd.to_datetime(carry["din_instante"])
+    carry_last = carry.set_index("nom_usina")["din_instante"]
+
+    # usina sem última linha guardada só pode ser usina nova no mês
+    seen = new["nom_usina"].isin(carry_last.index)
+    known = {r["nom_usina"] for r in state["agg"]}
+    if new.loc[~seen, "nom_usina"].isin(known).any():
+        return None
+    # e só instantes depois do último já somado da usina
+    if not (new["din_instante"] > new["nom_usina"].map(carry_last))[seen].all():
+        return None
+
+    carried = carry[carry["nom_usina"].isin(new["nom_usina"])].reset_index(drop=True)
+    rows = pd.concat([carried[new.columns.intersection(CARRY_COLS)], new],
+                     ignore_index=True)
+    gaps = interval_gaps(rows, period_end=month_end(ym))
+    old = rows["nom_usina"].isin(carried["nom_usina"])
+
+    cadence = pd.Series(state["cadence"], dtype=float)
+    if (~old).any():
+        cadence = pd.concat([cadence, cadence_hours(gaps[~old], rows.loc[~old, "nom_usina"])])
+    counts = pd.DataFrame.from_dict(state["gap_counts"], orient="index",
+                                    columns=["lt", "eq", "gt"])
+    counts = (
+        counts.add(_gap_counts(gaps, rows["nom_usina"], cadence), fill_value=0)
+              .sub(_gap_counts(carried["gap_h"], carried["nom_usina"], cadence), fill_value=0)
+              .astype(int)
+    )
+    c = counts.loc[carried["nom_usina"]]
+    n = c.sum(axis=1)
+    if not ((2 * c["lt"] < n) & (2 * c["gt"] < n)).all():
+        return None
+
+    cad = rows["nom_usina"].map(cadence)
+    rows["dt_h"] = gaps.where(gaps.isna(), gaps.clip(upper=cad)).fillna(cad)
+    add_energy(rows)
+    rows["gap_h"] = gaps
+
+    # somas: + linhas refeitas/novas, - o que a antiga última linha tinha somado
+    minus = carried[[*STORE_KEYS, "curtailment_mwh", "generation_mwh"]].copy()
+    minus[["curtailment_mwh", "generation_mwh"]] *= -1
+    agg = (
+        pd.concat([pd.DataFrame(state["agg"]), group_rows(rows), minus], ignore_index=True)
+          .groupby(STORE_KEYS, as_index=False)[["curtailment_mwh", "generation_mwh"]].sum()
+    )
+
+    last = _last_rows(rows)
+    kept = carry[~carry["nom_usina"].isin(last["nom_usina"])]
+    carry = pd.concat([kept.astype({"din_instante": str}), last], ignore_index=True)
+    last_inst = pd.Series([pd.Timestamp(state["last_instante"]),
+                           rows["din_instante"].max()]).max()
+    return _state(agg, carry, cadence, counts, last_inst)
+
+def tail_month(raw_dir: str, ym: str, session) -> pd.DataFrame:
+    # estado do tail em raw_dir/_tail; a cópia do mês é a de raw_dir
+    path = local_path(raw_dir, ym)
+    state_path = os.path.join(raw_dir, TAIL_SUBDIR, os.path.basename(path) + ".json")
+    state = tail_csv(
+        session, build_url(ym), path, state_path,
+        full=lambda p: tail_state(month_rows(read_ons_csv(p, READ_COLS), ym), ym),
+        fold=lambda delta, st: fold_month(delta, st, ym),
+    )
+    g = pd.DataFrame(state["agg"], columns=[*STORE_KEYS, "curtailment_mwh", "generation_mwh"])
+    return finish_aggregate(g, ym, pd.Timestamp(state["last_instante"]))
+
+# -------------------------------
+# um mês (roda no processo principal ou num worker do --jobs)
+# -------------------------------
+def process_month(raw_dir: str, ym: str, refresh: bool, tail: bool = False):
+    """(ym, agregado ou None, mensagem de erro ou None); não levanta exceção."""
+    session = shared_session()  # uma por processo
+    try:
+        if tail:
+            try:
+                return ym, tail_month(raw_dir, ym, session), None
+            except Exception as e:
+                print(f"⚠️ Tail {ym} falhou ({e}); baixando o mês inteiro")
+        path = download_month(raw_dir, ym, session, refresh)
+        df = read_ons_csv(path, READ_COLS)
+        return ym, monthly_aggregate_one_month(df, ym), None
+    except Exception as e:
+        return ym, None, str(e)  # texto: exceções nem sempre são picklable
+
+# -------------------------------
+# main
+# -------------------------------
+def run_monthly(argv, out_csv: str, raw_dir: str, dataset: str) -> None:
+    """main() dos scripts de COFF solar: CSV em `out_csv`, brutos em
+    `raw_dir`, tabela `dataset` no store."""
+    parser = argparse.ArgumentParser(description="Gera o monthly de COFF solar (ONS).")
+    parser.add_argument(
+        "--revisao", type=int, default=REVISION_MONTHS,
+        help=f"últimos N meses sempre rebaixados (padrão: {REVISION_MONTHS})"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=1,
+        help="processos em paralelo, um mês por vez em cada (padrão: 1)"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="mês corrente via tail: baixa e processa só as linhas novas"
+    )
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(out_csv), exist_ok=True)
+    os.makedirs(raw_dir, exist_ok=True)
+
+    today = datetime.today()
+    end_ym = f"{today.year:04d}-{today.month:02d}"
+
+    yms = list(yms_between(START_YM, end_ym))
+    refresh = set(yms[-args.revisao:]) if args.revisao > 0 else set()
+    flags = [ym in refresh for ym in yms]
+    tails = [args.incremental and ym == end_ym for ym in yms]
+
+    frames = []
+
+    # resultados voltam na ordem dos meses, com ou sem pool
+    # spawn (não fork): seguro também quando chamado de um processo com
+    # threads, como o run_daily_update.py
+    # with: exceção no meio não deixa workers para trás
+    pool = (ProcessPoolExecutor(max_workers=args.jobs, mp_context=get_context("spawn"))
+            if args.jobs > 1 else contextlib.nullcontext())
+    with pool as ex:
+        results = (ex.map if ex else map)(partial(process_month, raw_dir), yms, flags, tails)
+
+        for ym, out, err in results:
+            if err is not None:
+                print(f"[SKIP] {ym}: {err}")
+                continue
+            frames.append(out)
+            print(
+                f"[OK] {ym} | linhas: {len(out)} | "
+                f"corte_mwh: {out['curtailment_mwh'].sum():,.2f}"
+            )
+
+    final = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=OUT_COLS)
+
+    # upsert por mês no store; CSV só é regravado se algo mudou
+    con = connect_store()
+    bootstrap_from_csv(con, dataset, out_csv, "mes", STORE_KEYS)
+    changed = upsert_months(con, dataset, final, "mes", STORE_KEYS)
+    wrote = export_if_changed(con, dataset, out_csv, "mes", STORE_KEYS)
+    con.close()
+    print(f"Meses alterados: {changed or 'nenhum'} | CSV {'regravado' if wrote else 'mantido'}")
+
+    print(
+        f"\n✅ Gerado: {out_csv} | "
+        f"linhas: {len(final)} | "
+        f"meses: {final['mes'].nunique() if len(final) else 0}"
+    )
@@ -0,0 +1,187 @@
+# common/coff_store.py
+#
+# Resultados mensais de COFF (eólica e solar) num SQLite local, ao lado do
+# DB do PLD. Cada dataset é uma tabela com chave (mês + colunas-chave);
+# uma execução grava só os meses que recalculou (upsert por mês) e a
+# tabela coff_watermark guarda o último mês e uma versão que sobe quando
+# algum dado muda. O CSV do dashboard é exportado do store apenas quando
+# essa versão é diferente da última exportada.
+
+import os
+import re
+import sqlite3
+
+import pandas as pd
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STORE_PATH = os.path.join(REPO_DIR, "pld_ccee", "data", "coff_monthly.sqlite")
+
+SQLITE_CACHE_KIB = 16 * 1024
+
+
+def connect_store(path: str = STORE_PATH) -> sqlite3.Connection:
+    """Abre o store com WAL + synchronous=NORMAL, como o DB do PLD."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KIB}")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS coff_watermark (
+            DATASET TEXT PRIMARY KEY,
+            MAX_MONTH TEXT,
+            VERSION INTEGER NOT NULL DEFAULT 0,
+            EXPORTED_VERSION INTEGER NOT NULL DEFAULT -1
+        ) WITHOUT ROWID
+    """)
+    return con
+
+
+def _ident(name: str) -> str:
+    if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name):
+        raise ValueError(f"nome inválido para o store: {name!r}")
+    return f'"{name}"'
+
+
+def _sql_type(dtype) -> str:
+    if pd.api.types.is_float_dtype(dtype):
+        return "REAL"
+    if pd.api.types.is_integer_dtype(dtype):
+        return "INTEGER"
+    return "TEXT"
+
+
+def ensure_dataset(con: sqlite3.Connection, dataset: str, df: pd.DataFrame,
+                   month_col: str, key_cols) -> None:
+    """Cria a tabela do dataset a partir das colunas de `df` (se não existir)."""
+    keys = [month_col, *key_cols]
+    cols = ", ".join(f"{_ident(c)} {_sql_type(df[c].dtype)}" for c in df.columns)
+    pk = ", ".join(_ident(c) for c in keys)
+    # with: o INSERT abre uma transação implícita; sem commit aqui ela
+    # seguraria o lock de escrita até o próximo commit (que pode não vir)
+    with con:
+        con.execute(f"CREATE TABLE IF NOT EXISTS {_ident(dataset)} ({cols}, PRIMARY KEY ({pk})) WITHOUT ROWID")
+        con.execute("INSERT OR IGNORE INTO coff_watermark (DATASET) VALUES (?)", (dataset,))
+
+
+def watermark(con: sqlite3.Connection, dataset: str) -> str | None:
+    """Último mês gravado do dataset (uma linha da coff_watermark)."""
+    row = con.execute(
+        "SELECT MAX_MONTH FROM coff_watermark WHERE DATASET = ?", (dataset,)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def read_months(con: sqlite3.Connection, dataset: str, month_col: str,
+                months=None) -> pd.DataFrame:
+    sql = f"SELECT * FROM {_ident(dataset)}"
+    params = []
+    if months is not None:
+        months = list(months)
+        sql += f" WHERE {_ident(month_col)} IN ({','.join('?' * len(months))})"
+        params = months
+    return pd.read_sql_query(sql, con, params=params)
+
+
+def _same_rows(a: pd.DataFrame, b: pd.DataFrame, keys) -> bool:
+    if len(a) != len(b) or set(a.columns) != set(b.columns):
+        return False
+    a = a.sort_values(keys).reset_index(drop=True)
+    b = b[a.columns].sort_values(keys).reset_index(drop=True)
+    try:
+        pd.testing.assert_frame_equal(a, b, check_dtype=False, check_exact=True)
+    except AssertionError:
+        return False
+    return True
+
+
+def upsert_months(con: sqlite3.Connection, dataset: str, df: pd.DataFrame,
+                  month_col: str, key_cols) -> list:
+    """Substitui no store os meses presentes em `df`.
+
+    Cada mês recalculado troca todas as suas linhas (linha que sumiu do
+    mês também sai). Meses iguais ao que já está gravado não são tocados.
+    Retorna a lista de meses que mudaram.
+    """
+    if df.empty:
+        return []
+    keys = [month_col, *key_cols]
+    df = df.astype({month_col: str})
+    ensure_dataset(con, dataset, df, month_col, key_cols)
+
+    months = sorted(df[month_col].unique())
+    old = read_months(con, dataset, month_col, months)
+    changed = [
+        m for m in months
+        if not _same_rows(old[old[month_col] == m], df[df[month_col] == m], keys)
+    ]
+    if not changed:
+        return []
+
+    new = df[df[month_col].isin(changed)]
+    cols = list(df.columns)
+    placeholders = ",".join("?" * len(cols))
+    rows = zip(*(new[c].astype(object).where(new[c].notna(), None).tolist() for c in cols))
+
+    table = _ident(dataset)
+    with con:
+        con.executemany(f"DELETE FROM {table} WHERE {_ident(month_col)} = ?",
+                        [(m,) for m in changed])
+        con.executemany(
+            f"INSERT INTO {table} ({', '.join(_ident(c) for c in cols)}) VALUES ({placeholders})",
+            rows,
+        )
+        con.execute(f"""
+            UPDATE coff_watermark
+               SET VERSION = VERSION + 1,
+                   MAX_MONTH = (SELECT MAX({_ident(month_col)}) FROM {table})
+             WHERE DATASET = ?
+        """, (dataset,))
+    return changed
+
+
+def export_if_changed(con: sqlite3.Connection, dataset: str, out_csv: str,
+                      month_col: str, key_cols, **to_csv_kwargs) -> bool:
+    """Regrava `out_csv` do store se houve mudança desde a última exportação.
+
+    Retorna True se o arquivo foi gravado.
+    """
+    row = con.execute(
+        "SELECT VERSION, EXPORTED_VERSION FROM coff_watermark WHERE DATASET = ?", (dataset,)
+    ).fetchone()
+    if row is None:
+        return False
+    version, exported = row
+    if version == exported and os.path.exists(out_csv):
+        return False
+
+    df = read_months(con, dataset, month_col)
+    df = df.sort_values([month_col, *key_cols], kind="stable")
+    tmp = out_csv + ".tmp"
+    df.to_csv(tmp, index=False, **to_csv_kwargs)
+    os.replace(tmp, out_csv)
+
+    with con:
+        con.execute("UPDATE coff_watermark SET EXPORTED_VERSION = ? WHERE DATASET = ?",
+                    (version, dataset))
+    return True
+
+
+def bootstrap_from_csv(con: sqlite3.Connection, dataset: str, csv_path: str,
+                       month_col: str, key_cols) -> int:
+    """Carrega o CSV publicado quando o store ainda não tem o dataset.
+
+    Em CI o SQLite não é versionado: o CSV do repo é o histórico. A carga
+    conta como já exportada (o CSV é ele mesmo). Retorna as linhas lidas.
+    """
+    if watermark(con, dataset) is not None or not os.path.exists(csv_path):
+        return 0
+    df = pd.read_csv(csv_path, keep_default_na=False, na_values=[""],
+                     float_precision="round_trip")
+    if df.empty or month_col not in df.columns:
+        return 0
+    upsert_months(con, dataset, df, month_col, key_cols)
+    with con:
+        con.execute("UPDATE coff_watermark SET EXPORTED_VERSION = VERSION WHERE DATASET = ?",
+                    (dataset,))
+    return len(df)
@@ -0,0 +1,100 @@
+# common/columnar.py
+#
+# Arquivos colunares locais (cache e saídas intermediárias): Parquet
+# comprimido quando o pyarrow está instalado, pickle do pandas senão.
+
+import importlib.util
+import os
+
+import pandas as pd
+
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+# extensão dos arquivos gerados neste ambiente
+COLUMNAR_EXT = ".parquet" if HAS_PYARROW else ".pkl"
+
+
+def write_columnar(df: pd.DataFrame, path: str) -> None:
+    """Grava `df` em `path` (temporário + rename: nunca fica pela metade)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    if path.endswith(".parquet"):
+        df.to_parquet(tmp, index=False, compression="zstd")
+    else:
+        df.to_pickle(tmp)
+    os.replace(tmp, path)
+
+
+def read_columnar(path: str, columns=None) -> pd.DataFrame:
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+    df = pd.read_pickle(path)
+    return df if columns is None else df[list(columns)]
+
+
+# ---------------------------------------------------------------------
+# Saídas particionadas: <raiz>/<coluna>=<valor>/part-<tag><ext>
+# ---------------------------------------------------------------------
+# Um diretório por valor da chave (layout "hive", lido direto por
+# pyarrow/duckdb/spark). A coluna da chave não vai dentro do arquivo, só
+# no nome do diretório. `tag` identifica a origem dos dados (ex.: hash do
+# CSV de entrada): partição com a mesma tag não precisa ser regravada.
+
+def partition_dir(root: str, key: str, value: str) -> str:
+    return os.path.join(root, f"{key}={value}")
+
+
+def partition_path(root: str, key: str, value: str, tag: str) -> str:
+    return os.path.join(partition_dir(root, key, value), f"part-{tag}{COLUMNAR_EXT}")
+
+
+def partition_is_current(root: str, key: str, value: str, tag: str) -> bool:
+    return os.path.exists(partition_path(root, key, value, tag))
+
+
+def write_partition(df: pd.DataFrame, root: str, key: str, value: str, tag: str) -> str:
+    """Grava a partição `key=value` e apaga as versões anteriores dela."""
+    path = partition_path(root, key, value, tag)
+    write_columnar(df.drop(columns=[key], errors="ignore"), path)
+    for name in os.listdir(os.path.dirname(path)):
+        old = os.path.join(os.path.dirname(path), name)
+        if old != path and name.startswith("part-"):
+            os.remove(old)
+    return path
+
+
+def list_partitions(root: str, key: str) -> dict:
+    """{valor: caminho} das partições existentes em `root`."""
+    out = {}
+    if not os.path.isdir(root):
+        return out
+    prefix = f"{key}="
+    for d in sorted(os.listdir(root)):
+        if not d.startswith(prefix):
+            continue
+        parts = [p for p in os.listdir(os.path.join(root, d))
+                 if p.startswith("part-") and not p.endswith(".tmp")]
+        if parts:
+            out[d[len(prefix):]] = os.path.join(root, d, sorted(parts)[-1])
+    return out
+
+
+def read_partitions(root: str, key: str, values=None, columns=None) -> pd.DataFrame:
+    """Lê só as partições `values` (todas se None) e só as `columns` pedidas.
+
+    A coluna da chave volta como a primeira coluna do resultado.
+    """
+    parts = list_partitions(root, key)
+    if values is not None:
+        wanted = set(values)
+        parts = {v: p for v, p in parts.items() if v in wanted}
+    cols = None if columns is None else [c for c in columns if c != key]
+
+    frames = []
+    for value, path in parts.items():
+        df = read_columnar(path, cols)
+        df.insert(0, key, value)
+        frames.append(df)
+    if not frames:
+        return pd.DataFrame(columns=[key] + list(cols or []))
+    return pd.concat(frames, ignore_index=True)
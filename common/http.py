@@ -0,0 +1,230 @@
+# common/http.py
+#
+# Downloads HTTP: sessão com pool de conexões, gravação em streaming para
+# arquivo temporário + rename atômico, retry com backoff e downloads
+# paralelos com pool de threads limitado.
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# bytes por leitura do corpo HTTP
+CHUNK_BYTES = 1024 * 1024
+
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_BACKOFF_S = 2.0
+DOWNLOAD_WORKERS = 4
+
+
+def make_session(pool_size: int = DOWNLOAD_WORKERS) -> requests.Session:
+    """Sessão keep-alive com pool grande o bastante para `pool_size` threads."""
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+
+# sessão única do processo: quem roda vários scripts juntos (orquestrador)
+# reaproveita as mesmas conexões keep-alive
+SHARED_POOL_SIZE = 16
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_session() -> requests.Session:
+    """Sessão keep-alive compartilhada pelo processo (criada no 1º uso)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = make_session(SHARED_POOL_SIZE)
+        return _shared
+
+
+def _is_retryable(e: Exception) -> bool:
+    """Erro de rede, 5xx e 429 valem nova tentativa; 404 e afins, não."""
+    resp = getattr(e, "response", None)
+    if isinstance(e, requests.HTTPError) and resp is not None:
+        return resp.status_code >= 500 or resp.status_code == 429
+    return True
+
+
+def download_to_file(session: requests.Session, url: str, dest: str,
+                     retries: int = DOWNLOAD_RETRIES,
+                     backoff_s: float = DOWNLOAD_BACKOFF_S,
+                     timeout: int = 120) -> dict:
+    """Baixa `url` em streaming para `dest`.
+
+    Grava num temporário no mesmo diretório e faz os.replace no fim, então
+    `dest` nunca fica pela metade. Tenta de novo em erro de rede/HTTP, com
+    espera exponencial. Retorna {"bytes", "seconds", "headers"} (headers
+    da resposta que gerou o arquivo).
+    """
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    last_err = None
+
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff_s * 2 ** (attempt - 1))
+
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest) or ".",
+                                   prefix=os.path.basename(dest) + ".",
+                                   suffix=".part")
+        try:
+            t0 = time.perf_counter()
+            n = 0
+            with os.fdopen(fd, "wb") as f, \
+                    session.get(url, timeout=timeout, stream=True) as r:
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=CHUNK_BYTES):
+                    f.write(chunk)
+                    n += len(chunk)
+            os.replace(tmp, dest)
+            return {"bytes": n, "seconds": time.perf_counter() - t0, "headers": r.headers}
+        except (requests.RequestException, OSError) as e:
+            last_err = e
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if not _is_retryable(e):
+                break
+
+    raise RuntimeError(f"Falha ao baixar {url} após {attempt + 1} tentativa(s): {last_err}")
+
+
+def download_many(jobs, max_workers: int = DOWNLOAD_WORKERS,
+                  session: requests.Session | None = None, fetch=None, **kwargs) -> dict:
+    """Baixa vários (label, url, dest) em paralelo.
+
+    `fetch(session, url, dest, **kwargs)` faz cada download (padrão:
+    download_to_file; common.raw_cache.fetch_to passa pelo cache). Um
+    arquivo que falha (depois dos retries) não derruba os outros.
+    Retorna {label: resultado de `fetch` ou a exceção}.
+    """
+    fetch = fetch or download_to_file
+    jobs = list(jobs)
+    if not jobs:
+        return {}
+
+    own_session = session is None
+    if own_session:
+        session = make_session(max_workers)
+
+    def one(job):
+        label, url, dest = job
+        try:
+            res = fetch(session, url, dest, **kwargs)
+        except Exception as e:
+            print(f"⚠️ Falha em {label}: {e}")
+            return label, e
+        if res.get("status", "baixado") != "baixado":
+            print(f"Sem download {label}: {res['status']}")
+            return label, res
+        mb = res["bytes"] / 1e6
+        secs = res["seconds"]
+        print(f"Baixado {label}: {mb:.1f} MB em {secs:.1f}s "
+              f"({mb / secs if secs > 0 else 0:.1f} MB/s)")
+        return label, res
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as ex:
+            return dict(ex.map(one, jobs))
+    finally:
+        if own_session:
+            session.close()
+
+
+# ---------------------------------------------------------------------
+# Tail incremental (arquivo remoto que só cresce)
+# ---------------------------------------------------------------------
+# O CSV do mês corrente no S3 do ONS só ganha linhas no fim. Em vez de
+# baixar tudo de novo, pede só os bytes novos (Range). Um trecho do fim
+# da cópia local é pedido junto e comparado: se não bater, o arquivo foi
+# reescrito e o download volta a ser completo.
+
+TAIL_OVERLAP_BYTES = 4096
+
+
+def tail_to_file(session: requests.Session, url: str, dest: str,
+                 etag: str | None = None, overlap: int = TAIL_OVERLAP_BYTES,
+                 timeout: int = 120) -> dict:
+    """Atualiza `dest` com o que falta de `url`.
+
+    `etag` é o da última atualização (None força conferir pelo tamanho).
+    Retorna {"mode", "offset", "bytes", "size", "etag"}:
+    - "unchanged": mesmo ETag e mesmo tamanho, nada baixado;
+    - "append": bytes [offset, size) anexados a `dest`;
+    - "full": arquivo novo, encolheu, foi reescrito ou o servidor ignorou
+      o Range; `dest` baixado inteiro (offset 0).
+    """
+    local_size = os.path.getsize(dest) if os.path.exists(dest) else 0
+
+    def full(reason: str) -> dict:
+        print(f"Download completo ({reason}): {os.path.basename(dest)}")
+        res = download_to_file(session, url, dest, timeout=timeout)
+        # ETag do próprio GET: um HEAD depois poderia já ver bytes mais novos
+        return {"mode": "full", "offset": 0, "bytes": res["bytes"],
+                "size": os.path.getsize(dest), "etag": res["headers"].get("ETag")}
+
+    if not local_size:
+        return full("sem cópia local")
+
+    head = session.head(url, timeout=timeout, allow_redirects=True)
+    head.raise_for_status()
+    remote_etag = head.headers.get("ETag")
+    size = head.headers.get("Content-Length")
+    if size is None:
+        return full("servidor sem Content-Length")
+    size = int(size)
+
+    if size == local_size and etag is not None and remote_etag == etag:
+        return {"mode": "unchanged", "offset": local_size, "bytes": 0,
+                "size": size, "etag": remote_etag}
+    if size < local_size:
+        return full("arquivo remoto encolheu")
+    if size == local_size:
+        return full("sem ETag anterior" if etag is None else "mesmo tamanho, ETag diferente")
+
+    start = max(local_size - overlap, 0)
+    r = session.get(url, headers={"Range": f"bytes={start}-"}, timeout=timeout)
+    r.raise_for_status()
+    if r.status_code != 206:
+        return full("servidor ignorou o Range")
+    body = r.content
+    m = re.fullmatch(r"bytes (\d+)-(\d+)/(\d+|\*)", r.headers.get("Content-Range", "").strip())
+    if not m or int(m.group(1)) != start or int(m.group(2)) - start + 1 != len(body):
+        return full("Content-Range não confere com o pedido")
+    total = None if m.group(3) == "*" else int(m.group(3))
+
+    with open(dest, "rb") as f:
+        f.seek(start)
+        local_tail = f.read()
+    if body[:len(local_tail)] != local_tail:
+        return full("conteúdo antigo mudou")
+
+    new = body[len(local_tail):]
+    if os.stat(dest).st_nlink > 1 or not os.access(dest, os.W_OK):
+        # `dest` é (ou foi, antes de um evict) hardlink de um blob do
+        # raw_cache, que é somente leitura: copia antes de anexar
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(dest) or ".", suffix=".part")
+        os.close(fd)
+        shutil.copyfile(dest, tmp)
+        os.replace(tmp, dest)
+    try:
+        with open(dest, "ab") as f:
+            f.write(new)
+    except OSError:
+        # não deixa a cópia local com metade do trecho novo
+        with open(dest, "r+b") as f:
+            f.truncate(local_size)
+        raise
+    # sem ETag no 206, o do HEAD só vale se o arquivo não cresceu entre os dois
+    etag_new = r.headers.get("ETag") or (remote_etag if total == size else None)
+    return {"mode": "append", "offset": local_size, "bytes": len(new),
+            "size": local_size + len(new), "etag": etag_new}
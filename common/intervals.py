@@ -0,0 +1,129 @@
+# common/intervals.py
+#
+# Duração (em horas) de cada registro de séries ONS por usina. Cada linha
+# é a média de um intervalo; a energia é MW * duração. A duração sai da
+# diferença para o próximo instante DA MESMA usina (não do próximo da
+# tabela, que em geral é outra usina no mesmo instante).
+
+import numpy as np
+import pandas as pd
+
+from common.ons_csv import parse_instants
+
+# intervalo nominal dos dados ONS TM (30 min)
+NOMINAL_HOURS = 0.5
+# diferenças acima disso são buracos na série, não intervalos
+MAX_GAP_HOURS = 6.0
+
+
+def _plant_deltas(df, group_col, time_col, period_end, max_gap_h):
+    """Linhas em ordem de usina/instante e a diferença de cada uma para a
+    próxima da mesma usina (a última fecha em `period_end`), em ns.
+
+    Devolve (order, c, delta, ok, ngroups): c = código da usina na
+    ordem `order`; ok = diferença válida (positiva, até `max_gap_h`).
+    """
+    # instantes em int64 (ns); NaT vira o menor int64
+    t = parse_instants(df[time_col]).to_numpy("datetime64[ns]").view("int64")
+    nat = np.iinfo(np.int64).min
+
+    g = df[group_col]
+    if isinstance(g.dtype, pd.CategoricalDtype) and not g.isna().any():
+        codes = g.cat.codes.to_numpy()
+    else:
+        codes, _ = pd.factorize(g, use_na_sentinel=False)
+    ngroups = int(codes.max()) + 1
+
+    # ordem por usina; estável, então o arquivo já ordenado por instante
+    # dentro de cada usina dispensa o segundo critério
+    small = codes.astype(np.int16) if ngroups <= np.iinfo(np.int16).max else codes
+    order = np.argsort(small, kind="stable")  # radix sort em int16
+    c = codes[order]
+    ts = t[order]
+    same = c[1:] == c[:-1]
+    if np.any(ts[1:] < ts[:-1], where=same & (ts[:-1] != nat)):
+        order = np.lexsort((t, codes))
+        c = codes[order]
+        ts = t[order]
+        same = c[1:] == c[:-1]
+
+    # próximo instante da mesma usina; a última fecha em period_end
+    end = pd.Timestamp(period_end).value if period_end is not None else nat
+    nxt = np.empty_like(ts)
+    nxt[:-1] = np.where(same, ts[1:], end)
+    nxt[-1] = end
+
+    delta = nxt - ts
+    valid = (ts != nat) & (nxt != nat)
+    max_ns = int(max_gap_h * 3_600_000_000_000)
+    ok = valid & (delta > 0) & (delta <= max_ns)
+    return order, c, delta, ok, ngroups
+
+
+def _cadence(c, delta, ok, ngroups, nominal_h) -> np.ndarray:
+    dt = delta / 3_600_000_000_000
+    return (
+        pd.Series(dt[ok]).groupby(c[ok]).median()
+          .reindex(range(ngroups)).fillna(nominal_h).to_numpy()
+    )
+
+
+def interval_hours(df: pd.DataFrame, group_col: str = "nom_usina",
+                   time_col: str = "din_instante", period_end=None,
+                   nominal_h: float = NOMINAL_HOURS,
+                   max_gap_h: float = MAX_GAP_HOURS) -> pd.Series:
+    """Duração em horas de cada linha de `df`, calculada por usina.
+
+    - diferença para o próximo instante da mesma usina (ordem por usina e
+      instante; sem sort global quando o arquivo já vem em ordem por usina);
+    - a última linha de cada usina fecha em `period_end` (início do mês
+      seguinte): o intervalo que atravessa a virada do arquivo continua
+      com a duração certa;
+    - duração limitada à cadência da usina (mediana das diferenças
+      válidas); buraco, duplicata ou instante inválido recebem a cadência;
+    - série regular (todas as diferenças = `nominal_h`) vira constante
+      direto, sem medianas.
+    """
+    n = len(df)
+    if n == 0:
+        return pd.Series(np.zeros(0), index=df.index, name="dt_h")
+
+    order, c, delta, ok, ngroups = _plant_deltas(df, group_col, time_col,
+                                                 period_end, max_gap_h)
+    nominal_ns = int(nominal_h * 3_600_000_000_000)
+
+    # série regular: sem medianas e sem desfazer a ordenação
+    if np.all(delta == nominal_ns, where=ok):
+        return pd.Series(np.full(n, nominal_h), index=df.index, name="dt_h")
+
+    dt = delta / 3_600_000_000_000
+    cad = _cadence(c, delta, ok, ngroups, nominal_h)[c]
+    out = np.where(ok, np.minimum(dt, cad), cad)
+
+    res = np.empty(n)
+    res[order] = out
+    return pd.Series(res, index=df.index, name="dt_h")
+
+
+def interval_gaps(df: pd.DataFrame, group_col: str = "nom_usina",
+                  time_col: str = "din_instante", period_end=None,
+                  max_gap_h: float = MAX_GAP_HOURS) -> pd.Series:
+    """Diferença (horas) de cada linha para o próximo instante da mesma
+    usina, com a última fechando em `period_end`; NaN onde a diferença não
+    é válida (buraco acima de `max_gap_h`, duplicata, instante inválido).
+    São os valores de que interval_hours tira a cadência de cada usina."""
+    if len(df) == 0:
+        return pd.Series(np.zeros(0), index=df.index, name="gap_h")
+    order, _, delta, ok, _ = _plant_deltas(df, group_col, time_col,
+                                           period_end, max_gap_h)
+    res = np.empty(len(df))
+    res[order] = np.where(ok, delta / 3_600_000_000_000, np.nan)
+    return pd.Series(res, index=df.index, name="gap_h")
+
+
+def cadence_hours(gaps: pd.Series, plants: pd.Series,
+                  nominal_h: float = NOMINAL_HOURS) -> pd.Series:
+    """Cadência de cada usina a partir de interval_gaps: a mediana das
+    diferenças válidas (`nominal_h` se não há nenhuma), a mesma que
+    interval_hours usa como limite. Índice = usina."""
+    return gaps.groupby(plants, observed=True).median().fillna(nominal_h).rename("cadence_h")
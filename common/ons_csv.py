@@ -0,0 +1,243 @@
+# common/ons_csv.py
+#
+# Leitura dos CSVs de restrição (COFF) do ONS, usada pelos scripts eólico
+# e solar: detecta encoding/separador uma vez, pelo começo do arquivo, e
+# faz um único parse (pyarrow ou C) só das colunas pedidas, com dtypes
+# explícitos. O parse tolerante (engine python, tentativa e erro) fica
+# só como fallback. Também concentra o schema compacto (categorias para
+# códigos, float32 para medidas) usado nos frames brutos e o parse de
+# din_instante por valores distintos.
+
+import codecs
+import importlib.util
+import sys
+
+import numpy as np
+import pandas as pd
+
+# bytes lidos para detectar o formato
+SNIFF_BYTES = 64 * 1024
+
+PARSER_ENGINE = "pyarrow" if importlib.util.find_spec("pyarrow") else "c"
+
+# dtypes das colunas conhecidas dos arquivos de restrição do ONS; os
+# códigos (ONS_CATEGORY_COLS) já saem do parser como category, sem passar
+# por uma coluna de texto por linha
+ONS_DTYPES = {
+    "id_subsistema": "category",
+    "nom_subsistema": "category",
+    "id_estado": "category",
+    "nom_estado": "category",
+    "nom_usina": "category",
+    "id_ons": "category",
+    "ceg": "category",
+    "din_instante": "str",
+    "val_geracao": "float64",
+    "val_geracaolimitada": "float64",
+    "val_disponibilidade": "float64",
+    "val_geracaoreferencia": "float64",
+    "val_geracaoreferenciafinal": "float64",
+    "cod_razaorestricao": "category",
+    "cod_origemrestricao": "category",
+    "dsc_restricao": "str",
+}
+
+
+# códigos repetidos em toda linha de 30 min: category
+ONS_CATEGORY_COLS = [
+    "id_subsistema",
+    "nom_subsistema",
+    "id_estado",
+    "nom_estado",
+    "nom_usina",
+    "id_ons",
+    "ceg",
+    "cod_razaorestricao",
+    "cod_origemrestricao",
+]
+
+# medidas em MW com 3 casas: float32 basta para guardar (não para somar)
+ONS_FLOAT32_COLS = [
+    "val_geracao",
+    "val_geracaolimitada",
+    "val_disponibilidade",
+    "val_geracaoreferencia",
+    "val_geracaoreferenciafinal",
+]
+
+# formato do din_instante nos CSVs do ONS
+ONS_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def norm_col(c) -> str:
+    return str(c).strip().lower()
+
+
+def sniff_ons_csv(path: str) -> dict:
+    """Encoding, separador e cabeçalho a partir dos primeiros KB do arquivo."""
+    with open(path, "rb") as f:
+        raw = f.read(SNIFF_BYTES)
+
+    encoding = "utf-8"
+    try:
+        # final=False: tolera caractere multibyte cortado no fim da amostra
+        text = codecs.getincrementaldecoder("utf-8-sig")().decode(raw, final=False)
+    except UnicodeDecodeError:
+        encoding = "latin-1"
+        text = raw.decode("latin-1")
+
+    first = text.splitlines()[0] if text else ""
+    sep = ";" if first.count(";") >= first.count(",") else ","
+    header = [h.strip().strip('"') for h in first.split(sep)]
+    return {"encoding": encoding, "sep": sep, "header": header}
+
+
+def read_csv_robust(path):
+    encodings = ["utf-8", "latin-1"]
+    seps = [",", ";"]
+    last_err = None
+
+    for enc in encodings:
+        for sep in seps:
+            try:
+                df = pd.read_csv(
+                    path,
+                    sep=sep,
+                    encoding=enc,
+                    engine="python",
+                    on_bad_lines="skip",
+                )
+                if df.shape[1] <= 1:
+                    continue
+                return df
+            except Exception as e:
+                last_err = e
+
+    raise RuntimeError(f"Falha ao ler {path}: {last_err}")
+
+
+def read_ons_csv(path: str, columns=None) -> pd.DataFrame:
+    """Lê um CSV do ONS com colunas normalizadas (strip + lower).
+
+    `columns`: nomes (normalizados) a ler; os que não existirem no arquivo
+    são ignorados. None lê todas.
+    """
+    wanted = None if columns is None else {norm_col(c) for c in columns}
+
+    try:
+        fmt = sniff_ons_csv(path)
+        usecols = [h for h in fmt["header"] if wanted is None or norm_col(h) in wanted]
+        dtype = {h: ONS_DTYPES[norm_col(h)] for h in usecols if norm_col(h) in ONS_DTYPES}
+        if len(fmt["header"]) <= 1 or not usecols:
+            raise ValueError("formato não reconhecido")
+
+        df = pd.read_csv(
+            path,
+            sep=fmt["sep"],
+            encoding=fmt["encoding"],
+            engine=PARSER_ENGINE,
+            usecols=usecols,
+            dtype=dtype,
+            on_bad_lines="skip",
+        )
+    except Exception as e:
+        print(f"⚠️ Parse rápido falhou em {path} ({e}); usando fallback")
+        df = read_csv_robust(path)
+        if wanted is not None:
+            df = df[[c for c in df.columns if norm_col(c) in wanted]]
+        df = df.astype({c: "category" for c in df.columns
+                        if norm_col(c) in ONS_CATEGORY_COLS})
+
+    df.columns = [norm_col(c) for c in df.columns]
+    return df
+
+
+# ------------------------------------------------------------
+# Schema compacto
+# ------------------------------------------------------------
+def frame_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 1e6
+
+
+def frame_text_mb(df: pd.DataFrame) -> float:
+    """frame_mb se as colunas category fossem texto (object), como o
+    read_csv as traria sem dtype; calculado pelos códigos, sem converter."""
+    total = df.memory_usage(deep=True)
+    for c in df.columns:
+        s = df[c]
+        if not isinstance(s.dtype, pd.CategoricalDtype):
+            continue
+        counts = np.bincount(s.cat.codes.to_numpy() + 1, minlength=len(s.cat.categories) + 1)
+        sizes = np.array([sys.getsizeof(v) for v in s.cat.categories], dtype=np.int64)
+        total[c] = 8 * len(s) + counts[1:] @ sizes + counts[0] * sys.getsizeof(np.nan)
+    return total.sum() / 1e6
+
+
+def clean_codes(s: pd.Series, upper: bool = False) -> pd.Series:
+    """strip (+ upper) de uma coluna de códigos, por categoria e não por linha.
+
+    Vazio vira "nan" ("NAN" com upper), o mesmo texto que o astype(str) do
+    pandas < 3 gerava e que está nos CSVs já publicados.
+    """
+    s = s.astype("category")
+    cats = s.cat.categories
+    new = cats.astype(str).str.strip()
+    if upper:
+        new = new.str.upper()
+    out = s.map(dict(zip(cats, new))).astype(object)
+    out = out.where(s.notna(), "NAN" if upper else "nan")
+    return out.astype("category")
+
+
+def compact_ons_frame(df: pd.DataFrame, float_cols=ONS_FLOAT32_COLS,
+                      label: str | None = None) -> pd.DataFrame:
+    """Códigos -> category e `float_cols` -> float32.
+
+    Passe em `float_cols` só colunas que não entram em somas publicadas
+    (ou já usadas nas contas em float64). Com `label`, imprime a memória
+    antes/depois.
+    """
+    # "antes" como texto: códigos já lidos como category contam como object
+    before = frame_text_mb(df) if label else 0.0
+
+    for c in ONS_CATEGORY_COLS:
+        if c in df.columns and not isinstance(df[c].dtype, pd.CategoricalDtype):
+            df[c] = df[c].astype("category")
+    for c in float_cols:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce").astype("float32")
+
+    if label:
+        print(f"Memória {label}: {before:.1f} MB -> {frame_mb(df):.1f} MB")
+    return df
+
+
+# ------------------------------------------------------------
+# Instantes
+# ------------------------------------------------------------
+def parse_instants(s: pd.Series, fmt: str = ONS_TIME_FORMAT) -> pd.Series:
+    """Texto -> datetime64[ns], parseando cada valor distinto uma vez só.
+
+    Um mês tem ~1.5 mil instantes distintos repetidos por centenas de
+    usinas: fatoriza, converte os únicos com `fmt` e espalha de volta pelos
+    códigos. Valor fora do formato cai no parse genérico; inválido vira NaT.
+    """
+    if pd.api.types.is_datetime64_dtype(s):
+        return s
+
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes, uniques = s.cat.codes.to_numpy(), s.cat.categories
+    else:
+        codes, uniques = pd.factorize(s)
+
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    parsed = pd.to_datetime(text, format=fmt, errors="coerce")
+    bad = parsed.isna()
+    if bad.any():
+        parsed[bad] = pd.to_datetime(text[bad], format="mixed", errors="coerce")
+
+    # posição extra no fim = NaT, para os códigos -1 (vazio)
+    nat = np.iinfo(np.int64).min
+    table = np.append(parsed.to_numpy("datetime64[ns]").view("int64"), nat)
+    values = table[codes].view("datetime64[ns]")
+    return pd.Series(values, index=s.index, name=s.name)
@@ -0,0 +1,131 @@
+# common/plants.py
+#
+# Usina -> empresa a partir do mapping_citi.json. O mapping tem variações
+# de grafia da mesma usina ("CATAVENTOS ACARAÚ I" / "CATAVENTOS DO ACARAÚ
+# I"), então a busca é por nome normalizado (sem acento, maiúsculo, sem
+# pontuação nem conectivos). O índice normalizado é montado uma vez por
+# execução (ou lido do cache em disco) e aplicado nos nomes distintos, não
+# linha a linha.
+
+import hashlib
+import json
+import os
+import re
+import unicodedata
+
+import pandas as pd
+
+# muda quando a normalização ou o formato do cache muda (invalida o cache)
+INDEX_VERSION = 2
+
+CONNECTORS = {"DO", "DA", "DE", "DOS", "DAS", "E"}
+
+# valores do mapping que significam "sem empresa"
+EMPTY_EMPRESA = {"", "NAN", "NONE", "N/A"}
+
+
+def normalize_plant_name(name) -> str:
+    """'Cataventos do Acaraú I' -> 'CATAVENTOS ACARAU I'."""
+    s = unicodedata.normalize("NFKD", str(name))
+    s = "".join(ch for ch in s if not unicodedata.combining(ch)).upper()
+    words = re.sub(r"[^A-Z0-9]+", " ", s).split()
+    return " ".join(w for w in words if w not in CONNECTORS)
+
+
+def _empresa_of(value):
+    """Empresa de uma entrada do mapping (texto ou {"empresa": ...})."""
+    if isinstance(value, dict):
+        value = value.get("empresa")
+    if value is None:
+        return None
+    value = str(value).strip()
+    return None if value.upper() in EMPTY_EMPRESA else value
+
+
+def _index_and_conflicts(mapping):
+    """(índice, avisos): variações que normalizam igual mas discordam na
+    empresa (duas empresas, ou empresa numa e vazia na outra)."""
+    if not isinstance(mapping, dict):
+        return {}, []
+    if isinstance(mapping.get("usina_to_empresa"), dict):
+        mapping = mapping["usina_to_empresa"]
+
+    index = {}
+    variants = {}
+    for usina, value in mapping.items():
+        key = normalize_plant_name(usina)
+        empresa = _empresa_of(value)
+        variants.setdefault(key, []).append((usina, empresa))
+        if empresa is not None:
+            index.setdefault(key, empresa)
+
+    conflicts = []
+    for key, vs in variants.items():
+        if len({e for _, e in vs}) > 1:
+            detail = "; ".join(f"{u!r} -> {e or 'sem empresa'}" for u, e in vs)
+            conflicts.append(f"Mapping: {key!r} com empresas diferentes ({detail}); "
+                             f"usando {index[key]!r}")
+    return index, conflicts
+
+
+def build_plant_index(mapping) -> dict:
+    """{nome normalizado: empresa}, só com usinas que têm empresa.
+
+    Variações que normalizam igual viram uma entrada; se discordarem, fica
+    a primeira com empresa preenchida e o conflito é avisado.
+    """
+    index, conflicts = _index_and_conflicts(mapping)
+    for msg in conflicts:
+        print(f"⚠️ {msg}")
+    return index
+
+
+def load_plant_index(map_path: str, cache_path: str | None = None) -> dict:
+    """Índice do mapping em `map_path`, reaproveitando `cache_path`.
+
+    O cache guarda o sha256 do mapping e a versão da normalização; se
+    qualquer um mudar, o índice é refeito e regravado. Os conflitos do
+    mapping ficam no cache junto, para o aviso sair em toda execução.
+    """
+    if not os.path.exists(map_path):
+        return {}
+    with open(map_path, "rb") as f:
+        raw = f.read()
+    key = f"v{INDEX_VERSION}-{hashlib.sha256(raw).hexdigest()}"
+
+    if cache_path and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("key") == key:
+                for msg in cached["conflicts"]:
+                    print(f"⚠️ {msg}")
+                return cached["index"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    index, conflicts = _index_and_conflicts(json.loads(raw.decode("utf-8")))
+    for msg in conflicts:
+        print(f"⚠️ {msg}")
+
+    if cache_path:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        tmp = cache_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "index": index, "conflicts": conflicts}, f, ensure_ascii=False)
+        os.replace(tmp, cache_path)
+    return index
+
+
+def map_plants(names: pd.Series, index: dict) -> pd.Series:
+    """Empresa de cada linha; usina sem empresa no índice fica com o próprio nome.
+
+    A busca roda uma vez por nome distinto (factorize) e o resultado é
+    espalhado pelos códigos.
+    """
+    codes, uniques = pd.factorize(names)
+    uniques = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    found = uniques.map(lambda u: index.get(normalize_plant_name(u), u)).to_numpy(object)
+
+    out = pd.Series(found[codes], index=names.index, dtype=object)
+    return out.where(codes >= 0, None)
@@ -0,0 +1,273 @@
+# common/raw_cache.py
+#
+# Cache único dos arquivos brutos baixados (CKAN/S3 do ONS e da CCEE),
+# compartilhado pelos scripts. O conteúdo fica em blobs/<sha256>, uma
+# cópia por conteúdo, não importa de quantas URLs ou scripts ele veio. O
+# manifest (SQLite) liga cada URL ao blob, com ETag, Last-Modified,
+# tamanho, sha256 e data do download. Um pedido repetido vira GET
+# condicional (If-None-Match / If-Modified-Since): com 304 nada é baixado.
+# Os scripts que esperam o arquivo num diretório próprio recebem um
+# hardlink para o blob (fetch_to).
+#
+# Limpeza: python -m common.raw_cache --max-age-days 120 --max-gb 5
+
+import argparse
+import hashlib
+import os
+import shutil
+import sqlite3
+import stat
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from common.http import (
+    CHUNK_BYTES, DOWNLOAD_BACKOFF_S, DOWNLOAD_RETRIES, _is_retryable, shared_session,
+)
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.environ.get(
+    "RAW_CACHE_DIR", os.path.join(REPO_DIR, "dashboard", "data", "raw", "_cache", "files")
+)
+
+
+def _connect(cache_dir: str) -> sqlite3.Connection:
+    os.makedirs(os.path.join(cache_dir, "blobs"), exist_ok=True)
+    con = sqlite3.connect(os.path.join(cache_dir, "manifest.sqlite"), timeout=60)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS raw_manifest (
+            URL TEXT PRIMARY KEY,
+            SHA256 TEXT NOT NULL,
+            ETAG TEXT,
+            LAST_MODIFIED TEXT,
+            SIZE INTEGER NOT NULL,
+            FETCHED_AT TEXT NOT NULL,
+            LAST_USED REAL NOT NULL
+        ) WITHOUT ROWID
+    """)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_raw_manifest_sha ON raw_manifest (SHA256)")
+    return con
+
+
+def blob_path(sha256: str, cache_dir: str = CACHE_DIR) -> str:
+    return os.path.join(cache_dir, "blobs", sha256[:2], sha256)
+
+
+def lookup(url: str, cache_dir: str = CACHE_DIR) -> dict | None:
+    """Entrada do manifest para `url` (None se não há ou o blob sumiu)."""
+    con = _connect(cache_dir)
+    try:
+        row = con.execute(
+            "SELECT SHA256, ETAG, LAST_MODIFIED, SIZE, FETCHED_AT, LAST_USED "
+            "FROM raw_manifest WHERE URL = ?", (url,)
+        ).fetchone()
+    finally:
+        con.close()
+    if row is None or not os.path.exists(blob_path(row[0], cache_dir)):
+        return None
+    keys = ("sha256", "etag", "last_modified", "size", "fetched_at", "last_used")
+    return dict(zip(keys, row))
+
+
+def _record(cache_dir, url, sha, etag, last_modified, size, fetched_at):
+    con = _connect(cache_dir)
+    try:
+        with con:
+            con.execute("""
+                INSERT INTO raw_manifest (URL, SHA256, ETAG, LAST_MODIFIED, SIZE, FETCHED_AT, LAST_USED)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(URL) DO UPDATE SET
+                    SHA256 = excluded.SHA256, ETAG = excluded.ETAG,
+                    LAST_MODIFIED = excluded.LAST_MODIFIED, SIZE = excluded.SIZE,
+                    FETCHED_AT = excluded.FETCHED_AT, LAST_USED = excluded.LAST_USED
+            """, (url, sha, etag, last_modified, size, fetched_at, time.time()))
+    finally:
+        con.close()
+
+
+def _touch(cache_dir, url, fetched_at=None):
+    con = _connect(cache_dir)
+    try:
+        with con:
+            if fetched_at:
+                con.execute("UPDATE raw_manifest SET LAST_USED = ?, FETCHED_AT = ? WHERE URL = ?",
+                            (time.time(), fetched_at, url))
+            else:
+                con.execute("UPDATE raw_manifest SET LAST_USED = ? WHERE URL = ?",
+                            (time.time(), url))
+    finally:
+        con.close()
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+def _age_s(fetched_at: str) -> float:
+    return (datetime.now(timezone.utc) - datetime.fromisoformat(fetched_at)).total_seconds()
+
+
+def fetch(url: str, session: requests.Session | None = None, max_age_s: float = 0,
+          cache_dir: str = CACHE_DIR, retries: int = DOWNLOAD_RETRIES,
+          backoff_s: float = DOWNLOAD_BACKOFF_S, timeout: int = 120) -> dict:
+    """Garante `url` no cache e devolve {"path", "sha256", "status", "bytes", "seconds"}.
+
+    status: "cache" (entrada com menos de `max_age_s`, sem request),
+    "304" (revalidado, nada baixado), "baixado" (bytes novos) ou
+    "stale" (falha de rede, usando a cópia em cache).
+    """
+    session = session or shared_session()
+    entry = lookup(url, cache_dir)
+    t0 = time.perf_counter()
+
+    def result(status, sha, n=0):
+        return {"path": blob_path(sha, cache_dir), "sha256": sha, "status": status,
+                "bytes": n, "seconds": time.perf_counter() - t0}
+
+    if entry and max_age_s and _age_s(entry["fetched_at"]) < max_age_s:
+        _touch(cache_dir, url)
+        return result("cache", entry["sha256"])
+
+    headers = {}
+    if entry:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    tmp_dir = os.path.join(cache_dir, "blobs")
+    last_err = None
+    for attempt in range(retries + 1):
+        if attempt:
+            time.sleep(backoff_s * 2 ** (attempt - 1))
+        fd, tmp = tempfile.mkstemp(dir=tmp_dir, suffix=".part")
+        try:
+            h = hashlib.sha256()
+            n = 0
+            with os.fdopen(fd, "wb") as f, \
+                    session.get(url, headers=headers, timeout=timeout, stream=True) as r:
+                if r.status_code == 304 and entry:
+                    os.remove(tmp)
+                    _touch(cache_dir, url, _now_iso())
+                    return result("304", entry["sha256"])
+                r.raise_for_status()
+                for chunk in r.iter_content(chunk_size=CHUNK_BYTES):
+                    f.write(chunk)
+                    h.update(chunk)
+                    n += len(chunk)
+                etag = r.headers.get("ETag")
+                last_modified = r.headers.get("Last-Modified")
+
+            sha = h.hexdigest()
+            dest = blob_path(sha, cache_dir)
+            if os.path.exists(dest):
+                os.remove(tmp)  # mesmo conteúdo já guardado (outra URL/script)
+            else:
+                os.makedirs(os.path.dirname(dest), exist_ok=True)
+                os.chmod(tmp, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+                os.replace(tmp, dest)
+            _record(cache_dir, url, sha, etag, last_modified, n, _now_iso())
+            return result("baixado", sha, n)
+        except (requests.RequestException, OSError) as e:
+            last_err = e
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            if not _is_retryable(e):
+                break
+
+    if entry:
+        print(f"⚠️ {url}: {last_err}; usando a cópia do cache")
+        return result("stale", entry["sha256"])
+    raise RuntimeError(f"Falha ao baixar {url} após {attempt + 1} tentativa(s): {last_err}")
+
+
+def fetch_to(session: requests.Session | None, url: str, dest: str, **kwargs) -> dict:
+    """fetch() + `dest` apontando para o blob (hardlink; cópia se não der).
+
+    `dest` é sempre trocado por rename, nunca escrito por cima, então o
+    blob não é alterado por quem mexer em `dest` depois.
+    """
+    res = fetch(url, session=session, **kwargs)
+    src = res["path"]
+    if os.path.exists(dest) and os.path.samefile(src, dest):
+        return res
+
+    os.makedirs(os.path.dirname(dest) or ".", exist_ok=True)
+    tmp = f"{dest}.{os.getpid()}.link"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+    return res
+
+
+def evict(max_age_days: float | None = None, max_bytes: int | None = None,
+          cache_dir: str = CACHE_DIR) -> dict:
+    """Remove entradas sem uso há mais de `max_age_days` e, se o total
+    passar de `max_bytes`, as menos usadas recentemente. Blobs sem
+    nenhuma URL apontando são apagados."""
+    con = _connect(cache_dir)
+    removed = 0
+    try:
+        with con:
+            if max_age_days is not None:
+                cutoff = time.time() - max_age_days * 86400
+                removed += con.execute(
+                    "DELETE FROM raw_manifest WHERE LAST_USED < ?", (cutoff,)
+                ).rowcount
+
+            if max_bytes is not None:
+                # tamanho por blob (várias URLs podem dividir o mesmo)
+                blobs = con.execute("""
+                    SELECT SHA256, MAX(SIZE), MAX(LAST_USED) FROM raw_manifest
+                    GROUP BY SHA256 ORDER BY MAX(LAST_USED)
+                """).fetchall()
+                total = sum(b[1] for b in blobs)
+                for sha, size, _ in blobs:
+                    if total <= max_bytes:
+                        break
+                    removed += con.execute(
+                        "DELETE FROM raw_manifest WHERE SHA256 = ?", (sha,)
+                    ).rowcount
+                    total -= size
+
+        live = {r[0] for r in con.execute("SELECT DISTINCT SHA256 FROM raw_manifest")}
+    finally:
+        con.close()
+
+    freed = 0
+    blobs_dir = os.path.join(cache_dir, "blobs")
+    for sub in os.listdir(blobs_dir):
+        d = os.path.join(blobs_dir, sub)
+        if not os.path.isdir(d):
+            continue
+        for name in os.listdir(d):
+            if name not in live:
+                p = os.path.join(d, name)
+                freed += os.path.getsize(p)
+                os.remove(p)
+    return {"entries": removed, "bytes": freed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Limpa o cache de arquivos brutos.")
+    parser.add_argument("--max-age-days", type=float, default=None,
+                        help="remove entradas sem uso há mais de N dias")
+    parser.add_argument("--max-gb", type=float, default=None,
+                        help="mantém o cache abaixo de N GB (remove as menos usadas)")
+    args = parser.parse_args()
+
+    max_bytes = int(args.max_gb * 1e9) if args.max_gb is not None else None
+    res = evict(args.max_age_days, max_bytes)
+    print(f"Removidas {res['entries']} entradas | {res['bytes'] / 1e6:.1f} MB liberados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# common/tail.py
+#
+# Atualização incremental ("tail") de um CSV que só cresce no fim, como o
+# mês corrente do ONS: a cópia local é completada com os bytes novos
+# (common.http.tail_to_file) e só o trecho novo é processado e somado ao
+# resultado guardado da rodada anterior. O estado fica num JSON ao lado
+# da cópia e só vale para ela (mesmo tamanho e mtime de quando foi
+# gravado); qualquer dúvida vira recálculo do arquivo inteiro.
+
+import json
+import os
+
+import requests
+
+from common.http import tail_to_file
+from common.raw_cache import fetch_to, lookup
+
+
+def load_tail_state(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_tail_state(path: str, state: dict) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+def _file_sig(path: str) -> dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def write_delta_csv(path: str, offset: int, dest: str) -> bool:
+    """Grava em `dest` o cabeçalho de `path` + os bytes a partir de `offset`.
+
+    False se `offset` não cai no início de uma linha (aí o trecho novo não
+    é só um acréscimo de linhas).
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        f.seek(offset - 1)
+        if f.read(1) != b"\n":
+            return False
+        data = f.read()
+    with open(dest, "wb") as f:
+        f.write(header + data)
+    return True
+
+
+def tail_csv(session: requests.Session, url: str, path: str, state_path: str,
+             full, fold):
+    """Resultado do CSV `url` (cópia local em `path`) sem reprocessar o que não mudou.
+
+    `full(path)` calcula o resultado do arquivo inteiro; `fold(delta_path,
+    anterior)` soma um CSV só com as linhas novas ao resultado anterior, ou
+    devolve None quando não dá (o arquivo é recalculado inteiro). Os
+    resultados vão para o JSON do estado, então precisam ser serializáveis.
+    Erros de rede sobem: quem chama cai no download normal.
+    """
+    state = load_tail_state(state_path)
+    if not (state and state.get("url") == url and os.path.exists(path)
+            and {k: state.get(k) for k in ("size", "mtime_ns")} == _file_sig(path)):
+        # primeira vez (ou a cópia mudou por fora): arquivo inteiro, via raw_cache
+        fetch_to(session, url, path)
+        res = {"mode": "full", "bytes": os.path.getsize(path),
+               "etag": (lookup(url) or {}).get("etag")}
+        state = {}
+    else:
+        res = tail_to_file(session, url, path, etag=state.get("etag"))
+
+    data = None
+    if res["mode"] == "unchanged":
+        data = state["data"]
+    elif res["mode"] == "append":
+        delta_path = state_path + ".delta.csv"
+        try:
+            if write_delta_csv(path, res["offset"], delta_path):
+                data = fold(delta_path, state["data"])
+        finally:
+            if os.path.exists(delta_path):
+                os.remove(delta_path)
+        if data is None:
+            print(f"Tail {os.path.basename(path)}: trecho novo não é só acréscimo; recalculando")
+    if data is None:
+        data = full(path)
+
+    save_tail_state(state_path, {"url": url, "etag": res["etag"], **_file_sig(path),
+                                 "data": data})
+    print(f"Tail {os.path.basename(path)}: {res['mode']} | +{res['bytes'] / 1e6:.2f} MB")
+    return data
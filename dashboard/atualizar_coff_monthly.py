@@ -1,48 +1,156 @@
+import argparse
 import os
-import json
+import sys
 from datetime import datetime
 
 import pandas as pd
-import requests
 
-ONS_BASE = "https://ons-aws-prod-opendata.s3.amazonaws.com/dataset/restricao_coff_eolica_tm"
+# ONS_S3_BASE troca o host (ex.: servidor local de benchmarks/fake_sources.py)
+ONS_S3_BASE = os.environ.get("ONS_S3_BASE", "https://ons-aws-prod-opendata.s3.amazonaws.com")
+ONS_BASE = f"{ONS_S3_BASE}/dataset/restricao_coff_eolica_tm"
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, "data")
 
 OUT_CSV = os.path.join(DATA_DIR, "coff_eolica_monthly.csv")
 MAP_PATH = os.path.join(DATA_DIR, "mapping_citi.json")
+# índice normalizado do mapping (refeito quando o mapping muda)
+MAP_INDEX_CACHE = os.path.join(DATA_DIR, "raw", "_cache", "mapping_citi_index.json")
 
+# tabela no store SQLite (common/coff_store.py); OUT_CSV é exportado dele
+STORE_DATASET = "coff_eolica_empresa"
+STORE_KEYS = ["empresa"]
 
-def load_mapping():
-    if not os.path.exists(MAP_PATH):
-        return {}
-    with open(MAP_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+# --incremental: cópia local + estado do tail do mês corrente (common/tail.py)
+TAIL_DIR = os.path.join(DATA_DIR, "raw", "coff_eolica_tm", "_tail")
+
+NEEDED_COLS = {"din_instante", "nom_usina", "val_geracao", "val_geracaoreferenciafinal"}
+
+# .../dashboard -> raiz do repo (para importar common/)
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+from common.http import shared_session  # noqa: E402
+from common.raw_cache import fetch  # noqa: E402
+from common.ons_csv import parse_instants  # noqa: E402
+from common.tail import tail_csv  # noqa: E402
+from common.plants import load_plant_index, map_plants  # noqa: E402
+from common.coff_store import (  # noqa: E402
+    bootstrap_from_csv, connect_store, export_if_changed, upsert_months, watermark,
+)
+
+
+def month_file(yyyy_mm: str) -> str:
+    return f"RESTRICAO_COFF_EOLICA_{yyyy_mm}.csv"
+
+
+def read_month_csv(path: str) -> pd.DataFrame:
+    return pd.read_csv(path, sep=";", encoding="utf-8")
 
 
 def fetch_month(yyyy_mm: str) -> pd.DataFrame:
-    url = f"{ONS_BASE}/RESTRICAO_COFF_EOLICA_{yyyy_mm}.csv"
-    r = requests.get(url, timeout=60)
-    if r.status_code != 200:
+    url = f"{ONS_BASE}/{month_file(yyyy_mm)}"
+    try:
+        res = fetch(url, timeout=60)  # raw_cache: 304 quando o mês não mudou
+    except RuntimeError:
         return pd.DataFrame()
-    from io import StringIO
-    return pd.read_csv(StringIO(r.text), sep=";", encoding="utf-8")
+    return read_month_csv(res["path"])
+
+
+def month_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Linhas do ONS -> ym, nom_usina, din_instante, coff_mwh, ger_mwh."""
+    # valida colunas ONS
+    if not NEEDED_COLS.issubset(df.columns):
+        raise SystemExit(
+            f"Colunas ONS faltando. Esperadas: {sorted(list(NEEDED_COLS))}\n"
+            f"Encontradas: {list(df.columns)}"
+        )
+    df = df[sorted(NEEDED_COLS)].copy()
+
+    df["din_instante"] = parse_instants(df["din_instante"])
+    df = df.dropna(subset=["din_instante"])
+
+    df["ger_mwmed"] = pd.to_numeric(df["val_geracao"], errors="coerce")
+    df["ref_mwmed"] = pd.to_numeric(df["val_geracaoreferenciafinal"], errors="coerce")
+    df = df.dropna(subset=["ger_mwmed", "ref_mwmed"])
+
+    df["coff_mwmed"] = (df["ref_mwmed"] - df["ger_mwmed"]).clip(lower=0.0)
+
+    # assumindo base horária (MWmed por hora -> MWh)
+    df["ger_mwh"] = df["ger_mwmed"]
+    df["coff_mwh"] = df["coff_mwmed"]
+
+    df["ym"] = df["din_instante"].dt.strftime("%Y-%m").astype(str).str.strip()
+    return df[["ym", "nom_usina", "din_instante", "coff_mwh", "ger_mwh"]]
+
+
+def usina_sums(rows: pd.DataFrame) -> pd.DataFrame:
+    """Somas por ym/usina (+ último instante somado de cada uma).
+
+    A empresa só entra no fim (main), então uma mudança no mapping não
+    invalida somas guardadas no estado do tail.
+    """
+    return (
+        rows.groupby(["ym", "nom_usina"], dropna=False, as_index=False)
+            .agg(coff_mwh=("coff_mwh", "sum"), ger_mwh=("ger_mwh", "sum"),
+                 last_instante=("din_instante", "max"))
+    )
+
+
+# ------------------------------------------------------------
+# --incremental: mês corrente só com as linhas novas
+# ------------------------------------------------------------
+def sums_to_state(sums: pd.DataFrame) -> list:
+    out = sums.astype({"last_instante": str}).astype(object)
+    return out.where(out.notna(), None).to_dict("records")
 
 
-def last_ym_existing() -> str | None:
-    if not os.path.exists(OUT_CSV):
+def sums_from_state(records: list) -> pd.DataFrame:
+    sums = pd.DataFrame(records, columns=["ym", "nom_usina", "coff_mwh", "ger_mwh",
+                                          "last_instante"])
+    sums["last_instante"] = pd.to_datetime(sums["last_instante"])
+    return sums.astype({"coff_mwh": float, "ger_mwh": float})
+
+
+def fold_month(delta_path: str, records: list):
+    """Soma as linhas novas às somas do estado; None se alguma linha não é
+    posterior ao último instante já somado da usina (revisão, não acréscimo)."""
+    old = sums_from_state(records)
+    rows = month_rows(read_month_csv(delta_path))
+    plant_last = old.groupby("nom_usina")["last_instante"].max()
+    if (rows["din_instante"] <= rows["nom_usina"].map(plant_last)).any():
         return None
+
+    both = pd.concat([old, usina_sums(rows)], ignore_index=True)
+    sums = (
+        both.groupby(["ym", "nom_usina"], dropna=False, as_index=False)
+            .agg(coff_mwh=("coff_mwh", "sum"), ger_mwh=("ger_mwh", "sum"),
+                 last_instante=("last_instante", "max"))
+    )
+    return sums_to_state(sums)
+
+
+def tail_month(yyyy_mm: str) -> pd.DataFrame | None:
+    """Somas do mês via tail; None se não deu (aí vale o fetch_month)."""
+    name = month_file(yyyy_mm)
     try:
-        old = pd.read_csv(OUT_CSV)
-        if old.empty or "ym" not in old.columns:
-            return None
-        v = old["ym"].dropna()
-        if v.empty:
-            return None
-        return str(v.max())
-    except Exception:
+        records = tail_csv(
+            shared_session(), f"{ONS_BASE}/{name}",
+            os.path.join(TAIL_DIR, name), os.path.join(TAIL_DIR, f"{name}.json"),
+            full=lambda path: sums_to_state(usina_sums(month_rows(read_month_csv(path)))),
+            fold=fold_month,
+        )
+    except Exception as e:
+        print(f"⚠️ Tail {yyyy_mm} falhou ({e}); baixando o mês inteiro")
         return None
+    return sums_from_state(records)
+
+
+def last_ym_existing(con) -> str | None:
+    # store vazio (ex.: CI sem o SQLite): o CSV publicado vira o histórico
+    try:
+        bootstrap_from_csv(con, STORE_DATASET, OUT_CSV, "ym", STORE_KEYS)
+    except Exception as e:
+        print(f"⚠️ Não consegui carregar {OUT_CSV} no store: {e}")
+    return watermark(con, STORE_DATASET)
 
 
 def ym_to_dt(ym: str) -> datetime:
@@ -68,19 +176,17 @@ def months_from(start_ym: str) -> list[str]:
     return out
 
 
-def map_empresa(nom_usina: str, mapping: dict) -> str:
-    if not isinstance(mapping, dict):
-        return nom_usina
-    if "usina_to_empresa" in mapping and isinstance(mapping["usina_to_empresa"], dict):
-        return mapping["usina_to_empresa"].get(nom_usina, nom_usina)
-    return mapping.get(nom_usina, nom_usina)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Atualiza o COFF eólico mensal por empresa.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="mês corrente via tail: baixa e processa só as linhas novas")
+    args = parser.parse_args(argv)
 
-
-def main():
     os.makedirs(DATA_DIR, exist_ok=True)
 
-    mapping = load_mapping()
-    last = last_ym_existing()
+    plant_index = load_plant_index(MAP_PATH, MAP_INDEX_CACHE)
+    con = connect_store()
+    last = last_ym_existing(con)
 
     if last:
         start_ym = last
@@ -91,43 +197,31 @@ def main():
 
     months = months_from(start_ym)
 
-    dfs = []
+    # um mês por vez: só as somas por usina ficam em memória
+    sums = []
     for m in months:
+        if args.incremental and m == months[-1]:
+            print(f"   - tail {m} ...")
+            sm = tail_month(m)
+            if sm is not None:
+                sums.append(sm)
+                continue
         print(f"   - baixando {m} ...")
         dfm = fetch_month(m)
         if not dfm.empty:
-            dfs.append(dfm)
+            sums.append(usina_sums(month_rows(dfm)))
+        del dfm
 
-    if not dfs:
+    if not sums:
         print("❌ Nenhum dado baixado do ONS.")
+        con.close()
         return
 
-    df = pd.concat(dfs, ignore_index=True)
-
-    # valida colunas ONS
-    needed = {"din_instante", "nom_usina", "val_geracao", "val_geracaoreferenciafinal"}
-    if not needed.issubset(df.columns):
-        raise SystemExit(
-            f"Colunas ONS faltando. Esperadas: {sorted(list(needed))}\n"
-            f"Encontradas: {list(df.columns)}"
-        )
-
-    df["din_instante"] = pd.to_datetime(df["din_instante"], errors="coerce")
-    df = df.dropna(subset=["din_instante"])
-
-    df["ger_mwmed"] = pd.to_numeric(df["val_geracao"], errors="coerce")
-    df["ref_mwmed"] = pd.to_numeric(df["val_geracaoreferenciafinal"], errors="coerce")
-    df = df.dropna(subset=["ger_mwmed", "ref_mwmed"])
-
-    df["coff_mwmed"] = (df["ref_mwmed"] - df["ger_mwmed"]).clip(lower=0.0)
-
-    # assumindo base horária (MWmed por hora -> MWh)
-    df["ger_mwh"] = df["ger_mwmed"]
-    df["coff_mwh"] = df["coff_mwmed"]
+    df = pd.concat(sums, ignore_index=True)
 
-    df["empresa"] = df["nom_usina"].astype(str).map(lambda x: map_empresa(x, mapping))
+    # uma busca por usina distinta, não por linha
+    df["empresa"] = map_plants(df["nom_usina"], plant_index)
     df["empresa"] = df["empresa"].fillna("N/A").astype(str).str.strip()
-    df["ym"] = df["din_instante"].dt.strftime("%Y-%m").astype(str).str.strip()
 
     df = df[(df["empresa"] != "") & (df["ym"] != "")]
 
@@ -141,23 +235,20 @@ def main():
     novo["coff_pct"] = novo["coff_mwh"] / novo["ger_mwh"]
     novo.loc[novo["ger_mwh"] <= 0, "coff_pct"] = pd.NA
 
-    # merge com histórico: remove meses recalculados e concatena
-    if os.path.exists(OUT_CSV):
-        old = pd.read_csv(OUT_CSV)
-        if not old.empty and "ym" in old.columns:
-            old = old[~old["ym"].isin(novo["ym"].unique())]
-            final = pd.concat([old, novo], ignore_index=True)
-        else:
-            final = novo
-    else:
-        final = novo
+    # upsert por mês no store; CSV só é regravado se algo mudou
+    changed = upsert_months(con, STORE_DATASET, novo, "ym", STORE_KEYS)
+    wrote = export_if_changed(con, STORE_DATASET, OUT_CSV, "ym", STORE_KEYS,
+                              float_format="%.6f")
+    con.close()
 
-    final = final.sort_values(["ym", "empresa"])
-    final.to_csv(OUT_CSV, index=False, float_format="%.6f")
+    if not wrote:
+        print("✅ Nada mudou; CSV mantido:")
+        print(f"   {OUT_CSV}")
+        return
 
     print("✅ Atualizado com sucesso:")
     print(f"   {OUT_CSV}")
-    print(f"   meses atualizados: {sorted(novo['ym'].unique())}")
+    print(f"   meses atualizados: {changed}")
 
 
 if __name__ == "__main__":
@@ -1,14 +1,20 @@
 import os
 import re
+import sys
 import glob
-import requests
+import json
+import hashlib
+import argparse
 import pandas as pd
 
 # =========================
 # CONFIG (ONS / CKAN)
 # =========================
 DATASET_ID = "restricao_coff_eolica_usi"
-CKAN_API = "https://dados.ons.org.br/api/3/action/package_show"
+# nome dos resources mensais: "Restricoes_coff_eolicas-YYYY-MM"
+RESOURCE_PATTERN = r"Restricoes?_coff_eolicas-(\d{4})-(\d{2})"
+# ONS_CKAN_BASE troca o host (ex.: servidor local de benchmarks/fake_sources.py)
+CKAN_BASE = os.environ.get("ONS_CKAN_BASE", "https://dados.ons.org.br")
 
 START_YM = "2025-01"               # só a partir daqui
 ALWAYS_REFRESH_LAST_N = 2          # rebaixa últimos N meses (ONS revisa)
@@ -19,17 +25,53 @@ INTERVAL_HOURS = 0.5
 # só estes contam como "tem restrição"
 RESTR_CODES = {"CNF", "ENE", "REL"}
 
+# colunas usadas do CSV do ONS (o resto nem é parseado)
+TIME_COLS = ["din_instante", "instante", "datahora", "data_hora", "datetime"]
+READ_COLS = [
+    "nom_usina",
+    "val_geracao",
+    "val_geracaoreferencia",
+    "val_disponibilidade",
+    "cod_razaorestricao",
+    *TIME_COLS,
+]
+
 # =========================
 # PATHS (relativos ao repo)
 # =========================
 # Este script fica em .../dashboard/scripts/
 DASHBOARD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # .../dashboard
+REPO_DIR = os.path.dirname(DASHBOARD_DIR)
 DATA_DIR = os.path.join(DASHBOARD_DIR, "data")
 RAW_DIR = os.path.join(DATA_DIR, "raw")
 ONS_CACHE_DIR = os.path.join(RAW_DIR, "ons_restricao_coff_eolica_usi")
 
 OUT_MONTHLY_TEST = os.path.join(DATA_DIR, "coff_eolica_monthly_test.csv")
-OUT_RAW_TEST = os.path.join(RAW_DIR, "coff_eolica_raw_citi_test.csv")
+# dump raw particionado por mês: coff_eolica_raw_citi_test/mes=AAAA-MM/part-*.parquet
+OUT_RAW_TEST = os.path.join(RAW_DIR, "coff_eolica_raw_citi_test")
+RAW_PARTITION_KEY = "mes"
+
+# agregado por mês (usina x razão), indexado pelo sha256 do CSV de origem
+AGG_CACHE_DIR = os.path.join(ONS_CACHE_DIR, "_agg")
+AGG_CACHE_VERSION = 2
+
+# --incremental: estado do tail do mês corrente (offset, ETag, último instante)
+TAIL_STATE_DIR = os.path.join(ONS_CACHE_DIR, "_tail")
+
+sys.path.insert(0, REPO_DIR)
+from common.ckan import resource_map  # noqa: E402
+from common.http import DOWNLOAD_WORKERS, download_many, make_session, tail_to_file  # noqa: E402
+from common.raw_cache import fetch_to  # noqa: E402
+from common.ons_csv import (  # noqa: E402
+    ONS_FLOAT32_COLS, clean_codes, compact_ons_frame, frame_mb, frame_text_mb,
+    parse_instants, read_ons_csv,
+)
+from common.columnar import (  # noqa: E402
+    COLUMNAR_EXT, partition_is_current, read_columnar, write_columnar, write_partition,
+)
+
+# downloads simultâneos do ONS
+DOWNLOAD_JOBS = DOWNLOAD_WORKERS
 
 # =========================
 # HELPERS
@@ -45,57 +87,17 @@ def month_from_filename(path: str) -> str:
 def norm_cols(cols):
     return [str(c).strip().lower() for c in cols]
 
-def read_csv_robust(path):
-    encodings = ["utf-8", "latin-1"]
-    seps = [",", ";"]
-    last_err = None
-
-    for enc in encodings:
-        for sep in seps:
-            try:
-                df = pd.read_csv(
-                    path,
-                    sep=sep,
-                    encoding=enc,
-                    engine="python",
-                    on_bad_lines="skip",
-                )
-                if df.shape[1] <= 1:
-                    continue
-                return df
-            except Exception as e:
-                last_err = e
-
-    raise RuntimeError(f"Falha ao ler {path}: {last_err}")
-
 def to_num(series):
     return pd.to_numeric(series, errors="coerce").fillna(0.0)
 
 def list_ons_monthly_csv_urls():
-    resp = requests.get(CKAN_API, params={"id": DATASET_ID}, timeout=60)
-    resp.raise_for_status()
-    data = resp.json()
-    if not data.get("success"):
-        raise RuntimeError(f"CKAN success=false: {data}")
-
-    resources = data["result"].get("resources", [])
-    ym_to_url = {}
-
-    for r in resources:
-        name = (r.get("name") or "").strip()
-        fmt = (r.get("format") or "").strip().lower()
-        url = (r.get("url") or "").strip()
-
-        is_csv = (fmt == "csv") or url.lower().endswith(".csv")
-
-        # padrão comum no ONS: "Restricoes_coff_eolicas-YYYY-MM"
-        m = re.search(r"Restricoes?_coff_eolicas-(\d{4})-(\d{2})", name, flags=re.IGNORECASE)
-        if is_csv and m and url:
-            ym = f"{m.group(1)}-{m.group(2)}"
-            ym_to_url[ym] = url
+    index = resource_map(CKAN_BASE, DATASET_ID, pattern=RESOURCE_PATTERN)
+    ym_to_url = {ym: by_fmt["csv"]["url"].strip() for ym, by_fmt in index["by_ym"].items()
+                 if "csv" in by_fmt}
 
     if not ym_to_url:
-        sample = [(r.get("name"), r.get("format"), r.get("url")) for r in resources[:12]]
+        sample = [(r.get("name"), r.get("format"), r.get("url"))
+                  for r in list(index["by_name"].values())[:12]]
         raise RuntimeError(
             "Não achei resources mensais CSV no CKAN. Exemplos (primeiros 12):\n"
             + "\n".join([str(x) for x in sample])
@@ -107,121 +109,291 @@ def list_ons_monthly_csv_urls():
         raise RuntimeError(f"Nenhum mês >= {START_YM} encontrado no dataset.")
     return yms, ym_to_url
 
-def download_months(yms, ym_to_url):
+def month_csv_path(ym: str) -> str:
+    yyyy, mm = ym.split("-")
+    return os.path.join(ONS_CACHE_DIR, f"RESTRICAO_COFF_EOLICA_{yyyy}_{mm}.csv")
+
+def download_months(yms, ym_to_url, skip=()):
     os.makedirs(ONS_CACHE_DIR, exist_ok=True)
 
     last_n = set(yms[-ALWAYS_REFRESH_LAST_N:]) if ALWAYS_REFRESH_LAST_N > 0 else set()
-    downloaded = 0
+    jobs = []
 
     for ym in yms:
-        yyyy, mm = ym.split("-")
-        out_name = f"RESTRICAO_COFF_EOLICA_{yyyy}_{mm}.csv"
-        out_path = os.path.join(ONS_CACHE_DIR, out_name)
+        out_path = month_csv_path(ym)
+        out_name = os.path.basename(out_path)
 
-        if os.path.exists(out_path) and (ym not in last_n):
+        if ym in skip or (os.path.exists(out_path) and (ym not in last_n)):
             continue
 
         print(f"Baixando {ym} -> {out_name}")
-        r = requests.get(ym_to_url[ym], timeout=120)
-        r.raise_for_status()
-        with open(out_path, "wb") as f:
-            f.write(r.content)
-        downloaded += 1
+        jobs.append((ym, ym_to_url[ym], out_path))
+
+    # falha de um mês não derruba os outros (mês em cache segue valendo);
+    # via raw_cache: mês que não mudou no servidor volta 304, sem download
+    results = download_many(jobs, max_workers=DOWNLOAD_JOBS, fetch=fetch_to)
+    return sum(1 for r in results.values()
+               if not isinstance(r, Exception) and r["status"] == "baixado")
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def month_agg_cache_path(mes: str, sha: str) -> str:
+    # versão no nome: mudou o cálculo, o cache antigo deixa de valer
+    name = f"{mes}.v{AGG_CACHE_VERSION}.{sha[:16]}{COLUMNAR_EXT}"
+    return os.path.join(AGG_CACHE_DIR, name)
+
+def save_month_agg(mes: str, sha: str, agg: pd.DataFrame) -> None:
+    path = month_agg_cache_path(mes, sha)
+    # remove agregados de versões anteriores do mesmo mês
+    for old in glob.glob(os.path.join(AGG_CACHE_DIR, f"{mes}.*")):
+        if old != path:
+            os.remove(old)
+    write_columnar(agg, path)
+
+def raw_partition_tag(sha: str) -> str:
+    # mesma regra do cache de agregados: versão do cálculo + hash do CSV
+    return f"v{AGG_CACHE_VERSION}-{sha[:16]}"
+
+def process_month_csv(f) -> pd.DataFrame:
+    """CSV de um mês -> linhas Citi-like (uma por usina/intervalo)."""
+    df = read_ons_csv(f, READ_COLS)
+    df.columns = norm_cols(df.columns)
+    # memória do frame como lido (códigos já em category), antes de
+    # clean_codes; em texto é quanto as mesmas colunas ocupariam sem dtype
+    mem_txt, mem_lido = frame_text_mb(df), frame_mb(df)
+
+    required = {
+        "nom_usina",
+        "val_geracao",
+        "val_geracaoreferencia",
+        "val_disponibilidade",
+        "cod_razaorestricao",
+    }
+    missing = required - set(df.columns)
+    if missing:
+        raise RuntimeError(f"Faltam colunas {sorted(list(missing))}")
+
+    mes = month_from_filename(f)
+    if not mes:
+        raise RuntimeError("Não consegui extrair mês do filename")
+
+    # chaves repetidas em toda linha: category (groupby e memória)
+    df["mes"] = pd.Series(mes, index=df.index, dtype="category")
+    df["nom_usina"] = clean_codes(df["nom_usina"])
+
+    df["val_geracao"] = to_num(df["val_geracao"])
+    df["val_geracaoreferencia"] = to_num(df["val_geracaoreferencia"])
+    df["val_disponibilidade"] = to_num(df["val_disponibilidade"])
+
+    df["cod_razaorestricao"] = clean_codes(df["cod_razaorestricao"], upper=True)
+
+    # timestamp opcional
+    time_col = None
+    for cand in TIME_COLS:
+        if cand in df.columns:
+            time_col = cand
+            break
+    if time_col:
+        df["instante"] = parse_instants(df[time_col])
+    else:
+        df["instante"] = pd.NaT
+
+    # ======= CÁLCULO CITI-LIKE =======
+    cap_mw = df[["val_disponibilidade", "val_geracaoreferencia"]].min(axis=1)
+    term_mw = (cap_mw - df["val_geracao"]).clip(lower=0.0)
+
+    restr = df["cod_razaorestricao"].isin(list(RESTR_CODES))
+
+    df["curtailment_mwh"] = 0.0
+    df.loc[restr, "curtailment_mwh"] = term_mw.loc[restr] * INTERVAL_HOURS
+
+    df["generation_mwh"] = cap_mw.clip(lower=0.0) * INTERVAL_HOURS
+    df["_cap_mw"] = cap_mw
+
+    keep = [
+        "mes",
+        "instante",
+        "nom_usina",
+        "cod_razaorestricao",
+        "val_geracao",
+        "val_geracaoreferencia",
+        "val_disponibilidade",
+        "_cap_mw",
+        "curtailment_mwh",
+        "generation_mwh",
+    ]
+    # contas acima em float64; o que só é guardado vai para float32
+    out = compact_ons_frame(df[keep].copy(), float_cols=[*ONS_FLOAT32_COLS, "_cap_mw"])
+    print(f"Memória {mes}: {mem_txt:.1f} MB em texto -> {mem_lido:.1f} MB lido "
+          f"-> {frame_mb(out):.1f} MB compacto")
+    return out
+
+def aggregate_month(raw: pd.DataFrame) -> pd.DataFrame:
+    # chaves incluem "mes": agregar mês a mês = agregar tudo junto
+    return (
+        raw.groupby(["mes", "nom_usina", "cod_razaorestricao"], as_index=False, observed=True)
+           .agg({
+               "curtailment_mwh": "sum",
+               "generation_mwh": "sum",
+               "instante": "max",
+           })
+    )
 
-    return downloaded
+# =========================
+# TAIL INCREMENTAL (mês corrente)
+# =========================
+def load_tail_state(ym: str) -> dict:
+    path = os.path.join(TAIL_STATE_DIR, f"{ym}.json")
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_tail_state(ym: str, state: dict) -> None:
+    os.makedirs(TAIL_STATE_DIR, exist_ok=True)
+    path = os.path.join(TAIL_STATE_DIR, f"{ym}.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def fold_delta(path: str, offset: int, agg: pd.DataFrame):
+    """Soma as linhas a partir de `offset` ao agregado do mês.
+
+    Só vale para linhas novas no fim do arquivo: se o trecho não começa
+    numa linha nova ou traz, para alguma usina, instante que não é
+    posterior ao último já somado dela, devolve None (o mês é recalculado
+    inteiro).
+    """
+    with open(path, "rb") as f:
+        header = f.readline()
+        f.seek(offset - 1)
+        if f.read(1) != b"\n":
+            return None
+        data = f.read()
+
+    # mesmo padrão de nome do mês, para o process_month_csv achar o "mes"
+    delta_path = os.path.join(TAIL_STATE_DIR, "delta_" + os.path.basename(path))
+    with open(delta_path, "wb") as f:
+        f.write(header + data)
+    try:
+        raw_d = process_month_csv(delta_path)
+    finally:
+        os.remove(delta_path)
+
+    plant_last = agg.groupby(agg["nom_usina"].astype(str))["instante"].max()
+    seen = raw_d["nom_usina"].astype(str).map(plant_last)
+    if (raw_d["instante"] <= seen).any():
+        return None
+
+    keys = ["mes", "nom_usina", "cod_razaorestricao"]
+    both = pd.concat([agg, aggregate_month(raw_d)], ignore_index=True)
+    for c in keys:
+        both[c] = both[c].astype(str)
+    return (
+        both.groupby(keys, as_index=False)
+            .agg({"curtailment_mwh": "sum", "generation_mwh": "sum", "instante": "max"})
+    )
 
-def build_monthly_from_cached_csvs():
+def tail_month(session, ym: str, url: str) -> None:
+    """Atualiza o CSV do mês só com os bytes novos e soma no agregado.
+
+    Deixa o agregado do mês no cache (AGG_CACHE_DIR) já com o sha256 novo,
+    então o build seguinte nem relê o arquivo.
+    """
+    path = month_csv_path(ym)
+    state = load_tail_state(ym)
+    old_sha = file_sha256(path) if os.path.exists(path) else None
+    if state.get("sha") != old_sha:
+        state = {}  # a cópia local mudou por fora do tail
+
+    res = tail_to_file(session, url, path, etag=state.get("etag"))
+    sha = old_sha if res["mode"] == "unchanged" else file_sha256(path)
+    cache_path = month_agg_cache_path(ym, sha)
+
+    agg = None
+    old_cache = month_agg_cache_path(ym, old_sha) if old_sha else None
+    if res["mode"] == "append" and state and os.path.exists(old_cache):
+        agg = fold_delta(path, res["offset"], read_columnar(old_cache))
+        if agg is None:
+            print(f"Tail {ym}: trecho novo não é só acréscimo; recalculando o mês")
+    if agg is None and not os.path.exists(cache_path):
+        agg = aggregate_month(process_month_csv(path))
+    if agg is not None:
+        save_month_agg(ym, sha, agg)
+    else:
+        agg = read_columnar(cache_path)
+
+    last = agg["instante"].max()
+    save_tail_state(ym, {
+        "url": url,
+        "etag": res["etag"],
+        "offset": res["size"],
+        "sha": sha,
+        "last_instante": None if pd.isna(last) else str(last),
+    })
+    print(f"Tail {ym}: {res['mode']} | +{res['bytes'] / 1e6:.2f} MB | até {last}")
+
+def build_monthly_from_cached_csvs(write_raw: bool = False):
+    """Monta o monthly TESTE a partir dos CSVs em cache.
+
+    Processa um mês por vez: lê, agrega e descarta as linhas brutas antes
+    do próximo, então a memória fica em ~1 mês. O agregado de cada mês
+    fica em AGG_CACHE_DIR, indexado pelo sha256 do CSV: mês cujo arquivo
+    não mudou nem é lido. `write_raw` grava também o dump raw em
+    OUT_RAW_TEST, uma partição colunar por mês; só meses cujo CSV mudou
+    são regravados.
+    """
     pattern = os.path.join(ONS_CACHE_DIR, "RESTRICAO_COFF_EOLICA_*.csv")
     files = sorted(glob.glob(pattern))
     if not files:
         raise RuntimeError(f"Não achei CSVs baixados em {ONS_CACHE_DIR}")
 
-    parts = []
+    aggs = []
     fail = 0
+    hits = 0
+    raw_rows = 0
+    raw_parts = 0
 
     for f in files:
         try:
-            df = read_csv_robust(f)
-            df.columns = norm_cols(df.columns)
-
-            required = {
-                "nom_usina",
-                "val_geracao",
-                "val_geracaoreferencia",
-                "val_disponibilidade",
-                "cod_razaorestricao",
-            }
-            missing = required - set(df.columns)
-            if missing:
-                raise RuntimeError(f"Faltam colunas {sorted(list(missing))}")
-
             mes = month_from_filename(f)
-            if not mes:
-                raise RuntimeError("Não consegui extrair mês do filename")
-
-            df["mes"] = mes
-            df["nom_usina"] = df["nom_usina"].astype(str).str.strip()
-
-            df["val_geracao"] = to_num(df["val_geracao"])
-            df["val_geracaoreferencia"] = to_num(df["val_geracaoreferencia"])
-            df["val_disponibilidade"] = to_num(df["val_disponibilidade"])
-
-            df["cod_razaorestricao"] = df["cod_razaorestricao"].astype(str).str.strip().str.upper()
-
-            # timestamp opcional
-            time_col = None
-            for cand in ["din_instante", "instante", "datahora", "data_hora", "datetime"]:
-                if cand in df.columns:
-                    time_col = cand
-                    break
-            if time_col:
-                df["instante"] = pd.to_datetime(df[time_col], errors="coerce")
-            else:
-                df["instante"] = pd.NaT
-
-            # ======= CÁLCULO CITI-LIKE =======
-            cap_mw = df[["val_disponibilidade", "val_geracaoreferencia"]].min(axis=1)
-            term_mw = (cap_mw - df["val_geracao"]).clip(lower=0.0)
-
-            restr = df["cod_razaorestricao"].isin(list(RESTR_CODES))
-
-            df["curtailment_mwh"] = 0.0
-            df.loc[restr, "curtailment_mwh"] = term_mw.loc[restr] * INTERVAL_HOURS
-
-            df["generation_mwh"] = cap_mw.clip(lower=0.0) * INTERVAL_HOURS
-            df["_cap_mw"] = cap_mw
-
-            keep = [
-                "mes",
-                "instante",
-                "nom_usina",
-                "cod_razaorestricao",
-                "val_geracao",
-                "val_geracaoreferencia",
-                "val_disponibilidade",
-                "_cap_mw",
-                "curtailment_mwh",
-                "generation_mwh",
-            ]
-            parts.append(df[keep])
+            sha = file_sha256(f)
+            cache_path = month_agg_cache_path(mes, sha)
+            tag = raw_partition_tag(sha)
+            need_raw = write_raw and not partition_is_current(
+                OUT_RAW_TEST, RAW_PARTITION_KEY, mes, tag
+            )
+
+            if not need_raw and os.path.exists(cache_path):
+                aggs.append(read_columnar(cache_path))
+                hits += 1
+                continue
+
+            raw_m = process_month_csv(f)
+            agg = aggregate_month(raw_m)
+            if mes:
+                save_month_agg(mes, sha, agg)
+
+            aggs.append(agg)
+            if need_raw:
+                write_partition(raw_m, OUT_RAW_TEST, RAW_PARTITION_KEY, mes, tag)
+                raw_rows += len(raw_m)
+                raw_parts += 1
+            del raw_m
 
         except Exception as e:
             fail += 1
             print("⚠️ Erro em", os.path.basename(f), "->", e)
 
-    if not parts:
+    if not aggs:
         raise RuntimeError("Nenhum CSV foi processado com sucesso.")
 
-    raw = pd.concat(parts, ignore_index=True)
-
-    monthly = (
-        raw.groupby(["mes", "nom_usina", "cod_razaorestricao"], as_index=False)
-           .agg({
-               "curtailment_mwh": "sum",
-               "generation_mwh": "sum",
-               "instante": "max",
-           })
-    )
+    monthly = pd.concat(aggs, ignore_index=True)
 
     monthly["pct_curtailment"] = monthly.apply(
         lambda r: (r.curtailment_mwh / r.generation_mwh) if r.generation_mwh > 0 else 0.0,
@@ -232,27 +404,50 @@ def build_monthly_from_cached_csvs():
     monthly = monthly.drop(columns=["instante"])
 
     os.makedirs(RAW_DIR, exist_ok=True)
-    raw.to_csv(OUT_RAW_TEST, index=False, encoding="utf-8")
     monthly.to_csv(OUT_MONTHLY_TEST, index=False, encoding="utf-8")
 
     print("\n✅ OK")
     print("Gerados:")
     print(" -", OUT_MONTHLY_TEST)
-    print(" -", OUT_RAW_TEST)
+    if write_raw:
+        print(" -", OUT_RAW_TEST)
+        print(f"Partições raw regravadas: {raw_parts} | linhas: {raw_rows}")
     print("Falhas:", fail)
-    print("Linhas raw:", len(raw))
+    print(f"Meses do cache: {hits} | recalculados: {len(aggs) - hits}")
     print("Linhas monthly:", len(monthly))
 
 def main():
+    parser = argparse.ArgumentParser(description="Gera o monthly TESTE de COFF eólica (ONS).")
+    parser.add_argument(
+        "--raw", action="store_true",
+        help=f"grava também o dump raw particionado por mês ({os.path.basename(OUT_RAW_TEST)}/)"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="mês corrente: baixa só os bytes novos (Range) e soma no agregado"
+    )
+    args = parser.parse_args()
+
     print("Consultando ONS (CKAN)...")
     yms, ym_to_url = list_ons_monthly_csv_urls()
     print(f"Meses (filtrado): {yms[0]} -> {yms[-1]} (n={len(yms)})")
 
-    dl = download_months(yms, ym_to_url)
+    current = yms[-1] if args.incremental else None
+    dl = download_months(yms, ym_to_url, skip={current} if current else ())
     print(f"Download concluído. Arquivos baixados/atualizados nesta rodada: {dl}")
 
+    if current:
+        session = make_session(1)
+        try:
+            tail_month(session, current, ym_to_url[current])
+        except Exception as e:
+            # mês fica com o que já estava em disco; o build segue
+            print("⚠️ Tail falhou em", current, "->", e)
+        finally:
+            session.close()
+
     print("Construindo monthly TESTE (Citi-like)...")
-    build_monthly_from_cached_csvs()
+    build_monthly_from_cached_csvs(write_raw=args.raw)
 
 if __name__ == "__main__":
     main()
@@ -12,6 +12,10 @@ DB_PATH = os.path.join(BASE_DIR, "pld_ccee", "data", "pld_ccee.sqlite")
 OUT_DIR = os.path.join(BASE_DIR, "dashboard", "data")
 OUT_MONTHLY = os.path.join(OUT_DIR, "pld_monthly_avg_test.json")
 OUT_META = os.path.join(OUT_DIR, "pld_meta_test.json")
+OUT_MONTHLY_SUB = os.path.join(OUT_DIR, "pld_monthly_avg_submercado_test.json")
+
+# SUBMERCADO dos agregados gerais em pld_mensal (ver update_pld_2025.py)
+SUBMERCADO_TODOS = "todos"
 
 def main():
     os.makedirs(OUT_DIR, exist_ok=True)
@@ -21,31 +25,48 @@ def main():
     con = sqlite3.connect(DB_PATH)
     con.row_factory = sqlite3.Row
 
+    has_mensal = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='pld_mensal'"
+    ).fetchone()
+    if not has_mensal:
+        raise SystemExit(
+            "Tabela pld_mensal não encontrada. Rode: "
+            "python pld_ccee/src/update_pld_2025.py --rebuild-derived"
+        )
+
+    # agregados materializados pelo loader: só leituras por índice
     rows = con.execute("""
-      SELECT substr(DIA,1,7) as ym, AVG(PLD_MEDIO) as pld_medio_mensal
-      FROM pld_medio
-      WHERE length(DIA)=10
-      GROUP BY substr(DIA,1,7)
-      ORDER BY ym
+      SELECT MES as ym, SUBMERCADO as sub, PLD_MEDIO as pld_medio_mensal
+      FROM pld_mensal
+      ORDER BY SUBMERCADO, MES
     """).fetchall()
 
     monthly = {}
+    monthly_sub = {}
     for r in rows:
-        ym = r["ym"]
         val = r["pld_medio_mensal"]
-        monthly[ym] = float(val) if val is not None else None
+        val = float(val) if val is not None else None
+        if r["sub"] == SUBMERCADO_TODOS:
+            monthly[r["ym"]] = val
+        else:
+            monthly_sub.setdefault(r["sub"], {})[r["ym"]] = val
 
     rmax = con.execute("""
-      SELECT MAX(DIA) as max_dia
-      FROM pld_medio
-      WHERE length(DIA)=10
-    """).fetchone()
+      SELECT MAX_DIA as max_dia
+      FROM pld_mensal
+      WHERE SUBMERCADO = ?
+      ORDER BY MES DESC
+      LIMIT 1
+    """, (SUBMERCADO_TODOS,)).fetchone()
     max_dia = rmax["max_dia"] if rmax else None
     con.close()
 
     with open(OUT_MONTHLY, "w", encoding="utf-8") as f:
         json.dump(monthly, f, ensure_ascii=False, indent=2)
 
+    with open(OUT_MONTHLY_SUB, "w", encoding="utf-8") as f:
+        json.dump(monthly_sub, f, ensure_ascii=False, indent=2)
+
     with open(OUT_META, "w", encoding="utf-8") as f:
         json.dump({
             "max_dia": max_dia,
@@ -54,6 +75,7 @@ def main():
 
     print("✅ Gerados:")
     print(" -", OUT_MONTHLY)
+    print(" -", OUT_MONTHLY_SUB)
     print(" -", OUT_META)
     print("PLD max_dia:", max_dia)
 
@@ -1,16 +1,33 @@
 # pld_ccee/src/update_pld_2025.py
 
+import argparse
+import hashlib
 import io
 import os
+import queue
+import re
+import shutil
 import sqlite3
-from datetime import date
-
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+import numpy as np
 import requests
 import pandas as pd
 
-CKAN_BASE = "https://dadosabertos.ccee.org.br"
+# CCEE_CKAN_BASE troca o host (ex.: servidor local de benchmarks/fake_sources.py)
+CKAN_BASE = os.environ.get("CCEE_CKAN_BASE", "https://dadosabertos.ccee.org.br")
 DATASET = "pld_horario"
 
+# .../pld_ccee/src -> raiz do repo (para importar common/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+from common.ckan import resource_map  # noqa: E402
+from common.http import shared_session  # noqa: E402
+
 # Base = .../pld_ccee
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_PATH = os.path.join(BASE_DIR, "data", "pld_ccee.sqlite")
@@ -28,24 +45,41 @@ def resource_names_to_update():
 # CKAN helper
 # ------------------------------------------------------------
 def get_resource_url(resource_name: str) -> str:
-    url = f"{CKAN_BASE}/api/3/action/package_show"
-    r = requests.get(url, params={"id": DATASET}, timeout=60)
-    r.raise_for_status()
-    pkg = r.json()["result"]
-
-    for res in pkg["resources"]:
-        name = (res.get("name") or "").strip()
-        if name.lower() == resource_name.lower():
-            return res["url"]
-
-    raise RuntimeError(
-        f"Resource '{resource_name}' não encontrado no dataset '{DATASET}'."
-    )
+    res = resource_map(CKAN_BASE, DATASET)["by_name"].get(resource_name.lower())
+    if res is None:
+        raise RuntimeError(
+            f"Resource '{resource_name}' não encontrado no dataset '{DATASET}'."
+        )
+    return res["url"]
+
+
+def list_pld_resources() -> dict:
+    """{ano: (nome, url)} de todos os pld_horario_YYYY (package_show em cache)."""
+    out = {}
+    for name, res in resource_map(CKAN_BASE, DATASET)["by_name"].items():
+        m = re.fullmatch(r"pld_horario_(\d{4})", name)
+        if m:
+            out[int(m.group(1))] = (res["name"].strip(), res["url"])
+    return out
 
 
 # ------------------------------------------------------------
 # SQLite schema
 # ------------------------------------------------------------
+# cache de páginas do SQLite (negativo = KiB)
+SQLITE_CACHE_KIB = 64 * 1024
+
+
+def connect_db() -> sqlite3.Connection:
+    """Abre o DB com WAL + synchronous=NORMAL (carga em lote mais rápida)."""
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    con = sqlite3.connect(DB_PATH)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KIB}")
+    return con
+
+
 def ensure_tables(con: sqlite3.Connection) -> None:
     cur = con.cursor()
 
@@ -72,38 +106,350 @@ def ensure_tables(con: sqlite3.Connection) -> None:
         ON pld_horario (DIA, HORA, SUBMERCADO)
     """)
 
+    # permite apagar/recalcular só o intervalo recebido
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_pld_medio
+        ON pld_medio (DIA, HORA)
+    """)
+
+    # agregados materializados (por submercado e geral), mantidos pelo loader
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS pld_diario (
+            DIA TEXT,
+            SUBMERCADO TEXT,
+            PLD_MEDIO REAL,
+            PRIMARY KEY (DIA, SUBMERCADO)
+        ) WITHOUT ROWID
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS pld_mensal (
+            MES TEXT,
+            SUBMERCADO TEXT,
+            PLD_MEDIO REAL,
+            MAX_DIA TEXT,
+            PRIMARY KEY (MES, SUBMERCADO)
+        ) WITHOUT ROWID
+    """)
+
+    # cobre a leitura do export (série mensal de um submercado)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_pld_mensal_sub
+        ON pld_mensal (SUBMERCADO, MES, PLD_MEDIO, MAX_DIA)
+    """)
+
+    # último download aplicado de cada resource (download condicional)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS pld_manifest (
+            RESOURCE TEXT PRIMARY KEY,
+            URL TEXT,
+            ETAG TEXT,
+            LAST_MODIFIED TEXT,
+            SIZE INTEGER,
+            SHA256 TEXT,
+            FETCHED_AT TEXT
+        )
+    """)
+
     con.commit()
 
+    # DB antigo, sem os agregados: popula uma vez a partir do histórico
+    has_raw = cur.execute("SELECT 1 FROM pld_horario LIMIT 1").fetchone()
+    has_mensal = cur.execute("SELECT 1 FROM pld_mensal LIMIT 1").fetchone()
+    if has_raw and not has_mensal:
+        print("Populando agregados materializados a partir do histórico...")
+        with con:
+            refresh_derived(cur)
+
 
 # ------------------------------------------------------------
-# Core loader
+# Manifest (ETag / Last-Modified / tamanho / sha256)
 # ------------------------------------------------------------
-def load_csv_to_sqlite(csv_url: str) -> None:
-    print("Baixando CSV:", csv_url)
+def get_manifest(con: sqlite3.Connection, resource: str) -> dict | None:
+    row = con.execute(
+        "SELECT URL, ETAG, LAST_MODIFIED, SIZE, SHA256 "
+        "FROM pld_manifest WHERE RESOURCE = ?",
+        (resource,)
+    ).fetchone()
+    if row is None:
+        return None
+    return dict(zip(["url", "etag", "last_modified", "size", "sha256"], row))
 
-    resp = requests.get(csv_url, timeout=120)
-    resp.raise_for_status()
 
-    # detecta separador
-    sample = resp.text[:2000]
-    sep = ";" if sample.count(";") > sample.count(",") else ","
+def save_manifest(cur: sqlite3.Cursor, resource: str, url: str,
+                  headers, size: int, sha256: str) -> None:
+    cur.execute(
+        """
+        INSERT INTO pld_manifest
+            (RESOURCE, URL, ETAG, LAST_MODIFIED, SIZE, SHA256, FETCHED_AT)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (RESOURCE) DO UPDATE SET
+            URL = excluded.URL,
+            ETAG = excluded.ETAG,
+            LAST_MODIFIED = excluded.LAST_MODIFIED,
+            SIZE = excluded.SIZE,
+            SHA256 = excluded.SHA256,
+            FETCHED_AT = excluded.FETCHED_AT
+        """,
+        (
+            resource, url,
+            headers.get("ETag"), headers.get("Last-Modified"),
+            size, sha256,
+            datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        )
+    )
+
+
+def conditional_headers(manifest: dict | None) -> dict:
+    headers = {}
+    if manifest:
+        if manifest["etag"]:
+            headers["If-None-Match"] = manifest["etag"]
+        if manifest["last_modified"]:
+            headers["If-Modified-Since"] = manifest["last_modified"]
+    return headers
 
-    df = pd.read_csv(io.StringIO(resp.text), sep=sep)
-    df.columns = [c.strip().upper() for c in df.columns]
 
-    print("Colunas:", df.columns.tolist())
+def unchanged_by_headers(manifest: dict | None, resp: requests.Response) -> bool:
+    """Servidor ignorou o GET condicional, mas os validadores batem."""
+    if not manifest:
+        return False
+    etag = resp.headers.get("ETag")
+    if etag and manifest["etag"]:
+        return etag == manifest["etag"]
+    last_mod = resp.headers.get("Last-Modified")
+    if last_mod and manifest["last_modified"]:
+        return last_mod == manifest["last_modified"]
+    return False
 
-    # --------------------------------------------------------
-    # Checagens mínimas
-    # --------------------------------------------------------
-    if "MES_REFERENCIA" not in df.columns:
+
+# ------------------------------------------------------------
+# Tabelas derivadas de pld_horario
+# ------------------------------------------------------------
+# SUBMERCADO dos agregados que juntam todos os submercados
+SUBMERCADO_TODOS = "todos"
+
+# (tabela, chave do intervalo, INSERT ... SELECT que recalcula a tabela)
+# Em ordem de dependência. {where} filtra a fonte por DIA BETWEEN :lo AND :hi
+# (ou nada, no rebuild completo). Tabelas com chave MES são recalculadas
+# pelos meses inteiros que o intervalo toca.
+DERIVED_TABLES = [
+    ("pld_medio", "DIA", """
+        INSERT INTO pld_medio (DIA, HORA, PLD_MEDIO)
+        SELECT DIA, HORA, AVG(PLD_HORA)
+        FROM pld_horario
+        {where}
+        GROUP BY DIA, HORA
+    """),
+    ("pld_diario", "DIA", f"""
+        INSERT INTO pld_diario (DIA, SUBMERCADO, PLD_MEDIO)
+        SELECT DIA, SUBMERCADO, AVG(PLD_HORA)
+        FROM pld_horario
+        {{where}}
+        GROUP BY DIA, SUBMERCADO
+        UNION ALL
+        SELECT DIA, '{SUBMERCADO_TODOS}', AVG(PLD_MEDIO)
+        FROM pld_medio
+        {{where}}
+        GROUP BY DIA
+    """),
+    ("pld_mensal", "MES", f"""
+        INSERT INTO pld_mensal (MES, SUBMERCADO, PLD_MEDIO, MAX_DIA)
+        SELECT substr(DIA, 1, 7), SUBMERCADO, AVG(PLD_HORA), MAX(DIA)
+        FROM pld_horario
+        {{where}}
+        GROUP BY substr(DIA, 1, 7), SUBMERCADO
+        UNION ALL
+        SELECT substr(DIA, 1, 7), '{SUBMERCADO_TODOS}', AVG(PLD_MEDIO), MAX(DIA)
+        FROM pld_medio
+        {{where}}
+        GROUP BY substr(DIA, 1, 7)
+    """),
+]
+
+
+def refresh_derived(cur: sqlite3.Cursor, min_dia=None, max_dia=None) -> None:
+    """Recalcula as tabelas derivadas no intervalo [min_dia, max_dia].
+
+    Sem intervalo, recalcula tudo a partir do histórico. Não faz commit:
+    roda dentro da transação de quem chamou.
+    """
+    for table, key, insert_sql in DERIVED_TABLES:
+        if min_dia is None or max_dia is None:
+            cur.execute(f"DELETE FROM {table}")
+            cur.execute(insert_sql.format(where=""))
+            continue
+
+        if key == "MES":
+            lo, hi = min_dia[:7] + "-01", max_dia[:7] + "-31"
+            del_lo, del_hi = min_dia[:7], max_dia[:7]
+        else:
+            lo, hi = min_dia, max_dia
+            del_lo, del_hi = lo, hi
+
+        cur.execute(
+            f"DELETE FROM {table} WHERE {key} BETWEEN ? AND ?",
+            (del_lo, del_hi)
+        )
+        cur.execute(
+            insert_sql.format(where="WHERE DIA BETWEEN :lo AND :hi"),
+            {"lo": lo, "hi": hi}
+        )
+
+
+def rebuild_derived() -> None:
+    """Rebuild completo das tabelas derivadas (uso manual: --rebuild-derived)."""
+    if not os.path.exists(DB_PATH):
+        raise SystemExit(f"DB não encontrado: {DB_PATH}")
+
+    con = connect_db()
+    ensure_tables(con)
+    with con:
+        refresh_derived(con.cursor())
+    print_db_summary(con)
+    con.close()
+
+
+def print_db_summary(con: sqlite3.Connection) -> None:
+    cur = con.cursor()
+    n_h = cur.execute("SELECT COUNT(*) FROM pld_horario").fetchone()[0]
+    n_m = cur.execute("SELECT COUNT(*) FROM pld_medio").fetchone()[0]
+    min_db, max_db = cur.execute(
+        "SELECT MIN(DIA), MAX(DIA) FROM pld_medio"
+    ).fetchone()
+
+    print("OK ✅")
+    print("pld_horario:", n_h, "linhas")
+    print("pld_medio  :", n_m, "linhas")
+    print("DB range   :", min_db, "→", max_db)
+
+
+# ------------------------------------------------------------
+# Leitura em streaming
+# ------------------------------------------------------------
+# linhas por chunk do read_csv (memória fica limitada a ~1 chunk)
+CHUNK_ROWS = 200_000
+# bytes por leitura do corpo HTTP
+HTTP_CHUNK_BYTES = 1024 * 1024
+# começo do arquivo usado para detectar o formato (no mínimo a 1ª linha)
+SNIFF_BYTES = 2000
+
+
+class ResponseStream(io.RawIOBase):
+    """Expõe resp.iter_content como arquivo binário, para o pd.read_csv."""
+
+    def __init__(self, resp: requests.Response, chunk_bytes: int = HTTP_CHUNK_BYTES):
+        self._it = resp.iter_content(chunk_size=chunk_bytes)
+        self._buf = b""
+        self._sha = hashlib.sha256()
+        self.bytes_read = 0
+
+    @property
+    def sha256(self) -> str:
+        return self._sha.hexdigest()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buf:
+            try:
+                self._buf = next(self._it)
+            except StopIteration:
+                return 0
+            self._sha.update(self._buf)
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        self.bytes_read += n
+        return n
+
+
+class PrefixedStream(io.RawIOBase):
+    """`head` (já lido de `raw`) seguido do resto de `raw`."""
+
+    def __init__(self, head: bytes, raw):
+        self._head = head
+        self._raw = raw
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if not self._head:
+            data = self._raw.read(len(b))
+        else:
+            data, self._head = self._head[:len(b)], self._head[len(b):]
+        n = len(data or b"")
+        b[:n] = data or b""
+        return n
+
+
+def sniff_csv(sample: str) -> dict:
+    """Separador, formato decimal e cabeçalho a partir do começo do arquivo."""
+    sample = sample.lstrip("\ufeff")
+    sep = ";" if sample.count(";") > sample.count(",") else ","
+    header = [h.strip().strip('"') for h in sample.splitlines()[0].split(sep)] if sample else []
+    # "1.234,56": padrão da CCEE com ';'
+    decimal_br = sep == ";" and re.search(r"\d,\d", sample) is not None
+    return {"sep": sep, "header": header, "decimal_br": decimal_br}
+
+
+def iter_csv_chunks(fh, encoding: str = "utf-8", chunksize: int = CHUNK_ROWS,
+                    fast: bool = True):
+    """Detecta o formato pelo começo do arquivo e lê em chunks de linhas.
+
+    No caminho rápido, o parser já trata decimal/milhar brasileiros, lê só
+    as colunas usadas e traz o submercado como categoria. `fast=False`
+    mantém a leitura genérica (tudo é limpo depois, em clean_pld_frame).
+    """
+    # lê até ter a 1ª linha inteira: um stream em chunks pode entregar
+    # menos que o cabeçalho numa leitura só
+    head = b""
+    while len(head) < SNIFF_BYTES or b"\n" not in head:
+        part = fh.read(HTTP_CHUNK_BYTES)
+        if not part:
+            break
+        head += part
+    sample = head[:max(SNIFF_BYTES, head.find(b"\n") + 1)]
+    fmt = sniff_csv(sample.decode(encoding, errors="ignore"))
+    buf = io.BufferedReader(PrefixedStream(head, fh), buffer_size=HTTP_CHUNK_BYTES)
+
+    kwargs = {}
+    if fast and fmt["header"]:
+        by_upper = {h.upper(): h for h in fmt["header"]}
+        rename = resolve_columns(list(by_upper))
+        wanted = {"MES_REFERENCIA", *rename}
+        kwargs["usecols"] = lambda c: str(c).strip().upper() in wanted
+        sub_col = next(k for k, v in rename.items() if v == "SUBMERCADO")
+        kwargs["dtype"] = {by_upper[sub_col]: "category"}
+        if fmt["decimal_br"]:
+            kwargs["decimal"] = ","
+            kwargs["thousands"] = "."
+
+    yield from pd.read_csv(
+        buf,
+        sep=fmt["sep"],
+        encoding=encoding,
+        encoding_errors="replace",
+        chunksize=chunksize,
+        **kwargs,
+    )
+
+
+# ------------------------------------------------------------
+# Limpeza
+# ------------------------------------------------------------
+def resolve_columns(columns) -> dict:
+    """Mapeia as colunas do CSV da CCEE para os nomes usados no DB."""
+    if "MES_REFERENCIA" not in columns:
         raise RuntimeError(
             "Coluna MES_REFERENCIA não encontrada no CSV da CCEE."
         )
 
     def pick(*names):
         for n in names:
-            if n in df.columns:
+            if n in columns:
                 return n
         return None
 
@@ -118,114 +464,508 @@ def load_csv_to_sqlite(csv_url: str) -> None:
             f"DIA={col_dia}, HORA={col_hora}, SUB={col_sub}, PLD={col_pld}"
         )
 
-    # --------------------------------------------------------
-    # Monta df2 base
-    # --------------------------------------------------------
-    df2 = df[["MES_REFERENCIA", col_dia, col_hora, col_sub, col_pld]].copy()
-    df2 = df2.rename(columns={
+    return {
         col_dia:  "DIA_NUM",
         col_hora: "HORA",
         col_sub:  "SUBMERCADO",
         col_pld:  "PLD_HORA",
-    })
+    }
 
-    df2["MES_REFERENCIA"] = df2["MES_REFERENCIA"].astype(str).str.strip()
-    df2["DIA_NUM"] = pd.to_numeric(df2["DIA_NUM"], errors="coerce")
 
-    df2 = df2.dropna(subset=["MES_REFERENCIA", "DIA_NUM"])
+def dia_from_ints(mes_ref: pd.Series, dia_num: pd.Series) -> np.ndarray:
+    """YYYYMM + DIA -> datetime64[D] por aritmética inteira (inválidos = NaT)."""
+    ym = mes_ref.to_numpy(dtype="int64")
+    d = dia_num.to_numpy(dtype="int64")
+    mes = ym % 100
 
-    # reconstrói data: YYYYMM + DIA
-    df2["ANO"] = df2["MES_REFERENCIA"].str.slice(0, 4)
-    df2["MES"] = df2["MES_REFERENCIA"].str.slice(4, 6)
+    months = (ym // 100 - 1970) * 12 + (mes - 1)
+    start = months.astype("datetime64[M]").astype("datetime64[D]")
+    days_in_month = (
+        (months + 1).astype("datetime64[M]").astype("datetime64[D]") - start
+    ).astype("int64")
 
-    df2["DATA"] = pd.to_datetime(
-        df2["ANO"] + "-" +
-        df2["MES"] + "-" +
-        df2["DIA_NUM"].astype(int).astype(str),
-        errors="coerce"
+    out = start + (d - 1)
+    valid = (mes >= 1) & (mes <= 12) & (d >= 1) & (d <= days_in_month)
+    out[~valid] = np.datetime64("NaT")
+    return out
+
+
+def clean_pld_frame(df: pd.DataFrame, rename: dict, fast: bool = True) -> pd.DataFrame:
+    """Limpa um chunk bruto da CCEE -> DIA, HORA, SUBMERCADO, PLD_HORA.
+
+    Caminho rápido quando o parser já entregou números (datas por aritmética
+    inteira, PLD já em float); senão cai na limpeza por strings.
+    """
+    df2 = df[["MES_REFERENCIA", *rename]].rename(columns=rename)
+
+    dates_numeric = (
+        pd.api.types.is_numeric_dtype(df2["MES_REFERENCIA"])
+        and pd.api.types.is_numeric_dtype(df2["DIA_NUM"])
     )
+    if fast and dates_numeric:
+        df2 = df2.dropna(subset=["MES_REFERENCIA", "DIA_NUM"])
+        dia = dia_from_ints(df2["MES_REFERENCIA"], df2["DIA_NUM"])
+        ok = ~np.isnat(dia)
+        df2 = df2[ok].copy()
+        df2["DIA"] = np.datetime_as_string(dia[ok], unit="D")
+    else:
+        df2["MES_REFERENCIA"] = df2["MES_REFERENCIA"].astype(str).str.strip()
+        df2["DIA_NUM"] = pd.to_numeric(df2["DIA_NUM"], errors="coerce")
+
+        df2 = df2.dropna(subset=["MES_REFERENCIA", "DIA_NUM"])
+
+        # reconstrói data: YYYYMM + DIA
+        df2["ANO"] = df2["MES_REFERENCIA"].str.slice(0, 4)
+        df2["MES"] = df2["MES_REFERENCIA"].str.slice(4, 6)
+
+        df2["DATA"] = pd.to_datetime(
+            df2["ANO"] + "-" +
+            df2["MES"] + "-" +
+            df2["DIA_NUM"].astype(int).astype(str),
+            errors="coerce"
+        )
 
-    df2 = df2.dropna(subset=["DATA"])
-    df2["DIA"] = df2["DATA"].dt.strftime("%Y-%m-%d")
+        df2 = df2.dropna(subset=["DATA"])
+        df2["DIA"] = df2["DATA"].dt.strftime("%Y-%m-%d")
 
     # normaliza tipos
     df2["HORA"] = pd.to_numeric(df2["HORA"], errors="coerce").fillna(0).astype(int)
-    df2["SUBMERCADO"] = (
-        df2["SUBMERCADO"].astype(str).str.strip().str.lower()
-    )
+    if fast and isinstance(df2["SUBMERCADO"].dtype, pd.CategoricalDtype):
+        # normaliza só as categorias (poucas), não cada linha
+        sub = df2["SUBMERCADO"]
+        df2["SUBMERCADO"] = sub.map(
+            {c: str(c).strip().lower() for c in sub.cat.categories}
+        )
+    else:
+        df2["SUBMERCADO"] = (
+            df2["SUBMERCADO"].astype(str).str.strip().str.lower()
+        )
 
-    # PLD com vírgula decimal
-    pld_raw = df2["PLD_HORA"].astype(str).str.strip()
-    mask_pt = pld_raw.str.contains(",", na=False)
-    pld_raw.loc[mask_pt] = (
-        pld_raw.loc[mask_pt]
-        .str.replace(".", "", regex=False)
-        .str.replace(",", ".", regex=False)
-    )
-    df2["PLD_HORA"] = pd.to_numeric(pld_raw, errors="coerce")
+    if fast and pd.api.types.is_numeric_dtype(df2["PLD_HORA"]):
+        # vírgula decimal já tratada no read_csv
+        pass
+    else:
+        # PLD com vírgula decimal
+        pld_raw = df2["PLD_HORA"].astype(str).str.strip()
+        mask_pt = pld_raw.str.contains(",", na=False)
+        pld_raw.loc[mask_pt] = (
+            pld_raw.loc[mask_pt]
+            .str.replace(".", "", regex=False)
+            .str.replace(",", ".", regex=False)
+        )
+        df2["PLD_HORA"] = pd.to_numeric(pld_raw, errors="coerce")
 
     df2 = df2[["DIA", "HORA", "SUBMERCADO", "PLD_HORA"]]
-    df2 = df2.dropna()
+    return df2.dropna()
 
-    print("Linhas após limpeza:", len(df2))
 
-    if df2.empty:
-        print("⚠️ CSV sem dados válidos. Nada a atualizar.")
-        return
+# ------------------------------------------------------------
+# Core loader
+# ------------------------------------------------------------
+def iter_clean_chunks(stream, encoding: str = "utf-8",
+                      chunksize: int = CHUNK_ROWS, fast: bool = True):
+    """Lê o stream em chunks e devolve cada um já limpo."""
+    rename = None
+    for chunk in iter_csv_chunks(stream, encoding=encoding,
+                                 chunksize=chunksize, fast=fast):
+        chunk.columns = [str(c).strip().upper() for c in chunk.columns]
+        if rename is None:
+            print("Colunas:", chunk.columns.tolist())
+            rename = resolve_columns(chunk.columns)
+        yield clean_pld_frame(chunk, rename, fast=fast)
+
+
+def create_stage(cur: sqlite3.Cursor, stage: str = "pld_stage") -> None:
+    cur.execute(f"DROP TABLE IF EXISTS temp.{stage}")
+    cur.execute(f"""
+        CREATE TEMP TABLE {stage} (
+            DIA TEXT,
+            HORA INTEGER,
+            SUBMERCADO TEXT,
+            PLD_HORA REAL,
+            PRIMARY KEY (DIA, HORA, SUBMERCADO)
+        ) WITHOUT ROWID
+    """)
 
-    # --------------------------------------------------------
-    # SQLite update (seguro)
-    # --------------------------------------------------------
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    con = sqlite3.connect(DB_PATH)
-    ensure_tables(con)
-    cur = con.cursor()
 
-    min_dia = df2["DIA"].min()
-    max_dia = df2["DIA"].max()
+def stage_frame(cur: sqlite3.Cursor, df2: pd.DataFrame,
+                stage: str = "pld_stage") -> None:
+    # linha repetida no CSV: vale a última
+    cur.executemany(
+        f"INSERT INTO {stage} (DIA, HORA, SUBMERCADO, PLD_HORA) "
+        "VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (DIA, HORA, SUBMERCADO) "
+        "DO UPDATE SET PLD_HORA = excluded.PLD_HORA",
+        zip(
+            df2["DIA"].tolist(),
+            df2["HORA"].tolist(),
+            df2["SUBMERCADO"].tolist(),
+            df2["PLD_HORA"].tolist(),
+        )
+    )
 
-    print(f"Atualizando intervalo {min_dia} → {max_dia}")
 
-    # remove apenas o intervalo recebido
-    cur.execute(
-        "DELETE FROM pld_horario WHERE DIA BETWEEN ? AND ?",
-        (min_dia, max_dia)
-    )
+def spool_response(resp: requests.Response) -> tuple[str, int, str]:
+    """Grava o corpo num temporário, com o sha256 calculado no caminho.
 
-    df2.to_sql("pld_horario", con, if_exists="append", index=False)
+    Retorna (caminho, bytes, sha256); quem chama apaga o arquivo.
+    """
+    stream = ResponseStream(resp)
+    fd, path = tempfile.mkstemp(prefix="pld_", suffix=".csv")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(stream, f, HTTP_CHUNK_BYTES)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, stream.bytes_read, stream.sha256
 
-    # rebuild completo do pld_medio (a partir do histórico)
-    cur.execute("DELETE FROM pld_medio")
+
+def stage_csv_chunks(cur: sqlite3.Cursor, stream,
+                     encoding: str = "utf-8", chunksize: int = CHUNK_ROWS) -> int:
+    """Lê o stream (binário) em chunks, limpa e grava em temp.pld_stage.
+
+    Retorna o número de linhas válidas gravadas.
+    """
+    create_stage(cur)
+
+    n_rows = 0
+    for df2 in iter_clean_chunks(stream, encoding, chunksize):
+        stage_frame(cur, df2)
+        n_rows += len(df2)
+
+    print("Linhas após limpeza:", n_rows)
+    return n_rows
+
+
+def drop_horario_index(cur: sqlite3.Cursor) -> None:
+    cur.execute("DROP INDEX IF EXISTS idx_pld_horario")
+
+
+def create_horario_index(cur: sqlite3.Cursor) -> None:
     cur.execute("""
-        INSERT INTO pld_medio (DIA, HORA, PLD_MEDIO)
-        SELECT DIA, HORA, AVG(PLD_HORA)
-        FROM pld_horario
-        GROUP BY DIA, HORA
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_pld_horario
+        ON pld_horario (DIA, HORA, SUBMERCADO)
     """)
 
-    con.commit()
 
-    n_h = cur.execute("SELECT COUNT(*) FROM pld_horario").fetchone()[0]
-    n_m = cur.execute("SELECT COUNT(*) FROM pld_medio").fetchone()[0]
-    min_db = cur.execute("SELECT MIN(DIA) FROM pld_medio").fetchone()[0]
-    max_db = cur.execute("SELECT MAX(DIA) FROM pld_medio").fetchone()[0]
+def merge_stage(cur: sqlite3.Cursor, min_dia: str, max_dia: str,
+                stage: str = "pld_stage", replace: bool = False) -> None:
+    """Aplica o stage em pld_horario no intervalo [min_dia, max_dia].
 
-    con.close()
+    Padrão: apaga só as linhas do intervalo que sumiram do CSV e faz upsert
+    do resto (linhas iguais não são reescritas). Com `replace` (índice
+    único derrubado, em backfills grandes), troca o intervalo inteiro.
+    """
+    if replace:
+        cur.execute(
+            "DELETE FROM pld_horario WHERE DIA BETWEEN ? AND ?",
+            (min_dia, max_dia)
+        )
+        cur.execute(f"""
+            INSERT INTO pld_horario (DIA, HORA, SUBMERCADO, PLD_HORA)
+            SELECT DIA, HORA, SUBMERCADO, PLD_HORA FROM {stage}
+        """)
+        return
 
-    print("OK ✅")
-    print("pld_horario:", n_h, "linhas")
-    print("pld_medio  :", n_m, "linhas")
-    print("DB range   :", min_db, "→", max_db)
+    # linhas do intervalo que não vieram no CSV novo
+    cur.execute(f"""
+        DELETE FROM pld_horario
+        WHERE DIA BETWEEN ? AND ?
+          AND NOT EXISTS (
+              SELECT 1 FROM {stage} s
+              WHERE s.DIA = pld_horario.DIA
+                AND s.HORA = pld_horario.HORA
+                AND s.SUBMERCADO = pld_horario.SUBMERCADO
+          )
+    """, (min_dia, max_dia))
+
+    # WHERE true: exigido pelo parser do SQLite em INSERT ... SELECT ... ON CONFLICT
+    cur.execute(f"""
+        INSERT INTO pld_horario (DIA, HORA, SUBMERCADO, PLD_HORA)
+        SELECT DIA, HORA, SUBMERCADO, PLD_HORA FROM {stage} WHERE true
+        ON CONFLICT (DIA, HORA, SUBMERCADO) DO UPDATE
+            SET PLD_HORA = excluded.PLD_HORA
+            WHERE PLD_HORA IS NOT excluded.PLD_HORA
+    """)
+
+
+def apply_stage(cur: sqlite3.Cursor, stage: str = "pld_stage",
+                replace: bool = False) -> None:
+    """Stage -> pld_horario + derivadas no intervalo do stage; descarta o stage."""
+    min_dia, max_dia = cur.execute(
+        f"SELECT MIN(DIA), MAX(DIA) FROM {stage}"
+    ).fetchone()
+
+    if min_dia is not None:
+        print(f"Atualizando intervalo {min_dia} → {max_dia}")
+        merge_stage(cur, min_dia, max_dia, stage=stage, replace=replace)
+
+        # derivadas só no intervalo substituído
+        refresh_derived(cur, min_dia, max_dia)
+
+    cur.execute(f"DROP TABLE temp.{stage}")
+
+
+def print_rate(n_rows: int, elapsed: float) -> None:
+    print(
+        f"Carga: {n_rows} linhas em {elapsed:.2f}s "
+        f"({n_rows / elapsed if elapsed > 0 else 0:,.0f} linhas/s)"
+    )
+
+
+def load_csv_to_sqlite(csv_url: str, chunksize: int = CHUNK_ROWS,
+                       resource: str | None = None, force: bool = False,
+                       rebuild_index: bool = False) -> None:
+    """Baixa o CSV em streaming e grava no SQLite chunk a chunk.
+
+    Cada chunk limpo vai para uma tabela TEMP (em disco); no fim, o
+    intervalo recebido é trocado em pld_horario numa única transação,
+    junto com as derivadas. A memória fica limitada a ~1 chunk.
+
+    Com `resource`, usa o pld_manifest para um GET condicional: se o
+    arquivo não mudou (304, mesmo ETag/Last-Modified ou mesmo sha256),
+    nada é gravado. Sem validadores no servidor, o corpo vai para um
+    temporário com o sha256 calculado no caminho e só é parseado se o
+    hash mudou. `force` ignora o manifest. `rebuild_index` derruba o
+    índice único durante a carga e o recria no fim.
+    """
+    print("Baixando CSV:", csv_url)
+
+    con = connect_db()
+    ensure_tables(con)
+
+    manifest = None
+    if resource and not force:
+        manifest = get_manifest(con, resource)
+
+    try:
+        # bruto + derivadas numa única transação: ou tudo entra, ou nada
+        with shared_session().get(csv_url, timeout=120, stream=True,
+                                  headers=conditional_headers(manifest)) as resp, con:
+            if resp.status_code == 304:
+                print("Sem mudanças (304). Nada a atualizar.")
+                return
+            resp.raise_for_status()
+
+            if unchanged_by_headers(manifest, resp):
+                print("Sem mudanças (ETag/Last-Modified). Nada a atualizar.")
+                return
+
+            t0 = time.perf_counter()
+            cur = con.cursor()
+            encoding = resp.encoding or "utf-8"
+            if manifest:
+                # servidor sem validadores: confere o sha256 antes de parsear
+                spool, n_bytes, sha = spool_response(resp)
+                try:
+                    if sha == manifest["sha256"]:
+                        print("Sem mudanças (sha256). Nada a atualizar.")
+                        # guarda os validadores novos para o próximo GET condicional
+                        save_manifest(cur, resource, csv_url, resp.headers, n_bytes, sha)
+                        return
+                    with open(spool, "rb") as fh:
+                        n_rows = stage_csv_chunks(cur, fh, encoding, chunksize)
+                finally:
+                    os.remove(spool)
+            else:
+                stream = ResponseStream(resp)
+                n_rows = stage_csv_chunks(cur, stream, encoding, chunksize)
+                n_bytes, sha = stream.bytes_read, stream.sha256
+            print("Bytes lidos:", n_bytes)
+
+            if n_rows == 0:
+                print("⚠️ CSV sem dados válidos. Nada a atualizar.")
+                return
+
+            if rebuild_index:
+                drop_horario_index(cur)
+            apply_stage(cur, replace=rebuild_index)
+            if rebuild_index:
+                create_horario_index(cur)
+
+            if resource:
+                save_manifest(cur, resource, csv_url, resp.headers, n_bytes, sha)
+
+        print_rate(n_rows, time.perf_counter() - t0)
+        print_db_summary(con)
+    finally:
+        con.close()
+
+
+# ------------------------------------------------------------
+# Backfill histórico (todos os anos)
+# ------------------------------------------------------------
+# downloads/parses simultâneos no backfill
+BACKFILL_JOBS = 3
+
+# marcador de fim de um ano na fila do backfill
+_YEAR_DONE = object()
+
+
+def _backfill_fetch(year: int, url: str, out_q: queue.Queue,
+                    stop: threading.Event, chunksize: int) -> None:
+    """Worker: baixa e limpa um ano, empurrando os chunks para o escritor."""
+
+    def put(item) -> None:
+        # fila cheia = escritor atrasado; desiste se o backfill foi abortado
+        while not stop.is_set():
+            try:
+                out_q.put((year, item), timeout=1)
+                return
+            except queue.Full:
+                continue
+
+    try:
+        with shared_session().get(url, timeout=120, stream=True) as resp:
+            resp.raise_for_status()
+            stream = ResponseStream(resp)
+            for df2 in iter_clean_chunks(stream, resp.encoding or "utf-8", chunksize):
+                if stop.is_set():
+                    return
+                put(df2)
+            put((_YEAR_DONE, resp.headers, stream.bytes_read, stream.sha256))
+    except Exception as e:
+        put(e)
+
+
+def backfill(jobs: int = BACKFILL_JOBS, chunksize: int = CHUNK_ROWS,
+             force: bool = False, rebuild_index: bool = False) -> None:
+    """Carrega todos os pld_horario_YYYY do dataset.
+
+    Downloads e limpeza rodam em até `jobs` threads; só o escritor (esta
+    thread) toca no SQLite. Cada ano entra numa transação própria junto
+    com seu registro em pld_manifest, que serve de checkpoint: anos já
+    presentes no manifest são pulados, então um backfill interrompido
+    retoma de onde parou (`force` ignora os checkpoints).
+    """
+    resources = list_pld_resources()
+    if not resources:
+        raise RuntimeError(f"Nenhum pld_horario_YYYY no dataset '{DATASET}'.")
+
+    con = connect_db()
+    ensure_tables(con)
+    cur = con.cursor()
+
+    todo = []
+    for year in sorted(resources):
+        name, url = resources[year]
+        if not force and get_manifest(con, name):
+            print(f"[SKIP] {name} (checkpoint)")
+            continue
+        todo.append(year)
+
+    print(f"Backfill: {len(todo)} ano(s) a carregar, {jobs} em paralelo")
+    if not todo:
+        con.close()
+        return
+
+    if rebuild_index:
+        drop_horario_index(cur)
+        con.commit()
+
+    out_q = queue.Queue(maxsize=2 * jobs)
+    stop = threading.Event()
+    rows = {year: 0 for year in todo}
+    failed = []
+    t0 = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as ex:
+            for year in todo:
+                ex.submit(_backfill_fetch, year, resources[year][1],
+                          out_q, stop, chunksize)
+
+            remaining = len(todo)
+            try:
+                while remaining:
+                    year, item = out_q.get()
+                    name, url = resources[year]
+                    stage = f"pld_stage_{year}"
+
+                    if isinstance(item, pd.DataFrame):
+                        if rows[year] == 0:
+                            create_stage(cur, stage)
+                        stage_frame(cur, item, stage)
+                        rows[year] += len(item)
+                        continue
+
+                    remaining -= 1
+                    # stages dos outros anos não entram no rollback deste
+                    con.commit()
+
+                    if isinstance(item, Exception):
+                        print(f"[FAIL] {name}: {item}")
+                        cur.execute(f"DROP TABLE IF EXISTS temp.{stage}")
+                        failed.append(name)
+                        continue
+
+                    _, headers, size, sha256 = item
+                    with con:
+                        if rows[year]:
+                            apply_stage(cur, stage, replace=rebuild_index)
+                        save_manifest(cur, name, url, headers, size, sha256)
+                    print(f"[OK] {name} | linhas: {rows[year]} | bytes: {size}")
+            finally:
+                stop.set()
+    finally:
+        if rebuild_index:
+            create_horario_index(cur)
+            con.commit()
+
+    print_rate(sum(rows.values()), time.perf_counter() - t0)
+    if failed:
+        print("Falhas (rode de novo para retomar):", ", ".join(failed))
+    print_db_summary(con)
+    con.close()
 
 
 # ------------------------------------------------------------
 # Main
 # ------------------------------------------------------------
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Atualiza o PLD horário (CCEE) no SQLite.")
+    parser.add_argument(
+        "--rebuild-derived", action="store_true",
+        help="recalcula do zero as tabelas derivadas (pld_medio, pld_diario, pld_mensal) e sai"
+    )
+    parser.add_argument(
+        "--chunksize", type=int, default=CHUNK_ROWS,
+        help=f"linhas por chunk na leitura do CSV (padrão: {CHUNK_ROWS})"
+    )
+    parser.add_argument(
+        "--force", action="store_true",
+        help="ignora o manifest e reprocessa mesmo sem mudança no servidor"
+    )
+    parser.add_argument(
+        "--rebuild-index", action="store_true",
+        help="backfill grande: derruba e recria o índice de pld_horario na carga"
+    )
+    parser.add_argument(
+        "--backfill", action="store_true",
+        help="carrega todos os anos pld_horario_YYYY (retoma pelos checkpoints)"
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=BACKFILL_JOBS,
+        help=f"downloads/parses simultâneos no --backfill (padrão: {BACKFILL_JOBS})"
+    )
+    args = parser.parse_args(argv)
+
+    if args.rebuild_derived:
+        rebuild_derived()
+        return
+
+    if args.backfill:
+        backfill(jobs=args.jobs, chunksize=args.chunksize,
+                 force=args.force, rebuild_index=args.rebuild_index)
+        return
+
     for rn in resource_names_to_update():
         print(f"\n=== Atualizando resource {rn} ===")
         csv_url = get_resource_url(rn)
-        load_csv_to_sqlite(csv_url)
+        load_csv_to_sqlite(csv_url, chunksize=args.chunksize,
+                           resource=rn, force=args.force,
+                           rebuild_index=args.rebuild_index)
 
 
 if __name__ == "__main__":
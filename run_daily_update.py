@@ -0,0 +1,202 @@
+# run_daily_update.py
+#
+# Atualização diária (PLD + ONS) num único processo. Roda como tarefas
+# concorrentes os mesmos scripts que antes eram chamados um a um pelo
+# workflow, respeitando dependências (o export do PLD espera a carga do
+# PLD). Um loop asyncio coordena as tarefas e cada uma roda numa thread
+# do pool (download e parse); pandas/requests são importados uma vez e
+# todas usam a mesma sessão HTTP (common.http.shared_session).
+#
+# Limite: as threads dividem o GIL. Downloads e I/O se sobrepõem, mas o
+# parse/agregação em pandas do PLD e da eólica roda no processo principal
+# e disputa a CPU com as outras tarefas; só o solar com --solar-jobs > 1
+# agrega em processos próprios. O ganho vem de sobrepor a rede (o tempo
+# total cai para perto da fonte mais lenta quando o download domina);
+# com tudo em cache, as partes de CPU praticamente se somam.
+#
+# Uso:
+#   python run_daily_update.py                  # tudo
+#   python run_daily_update.py --only pld pld_json
+#   python run_daily_update.py --solar-jobs 4   # meses do solar em processos
+#   python run_daily_update.py --sem-tail       # mês corrente do ONS inteiro
+
+import argparse
+import asyncio
+import contextvars
+import importlib
+import inspect
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# nome -> (script, dependências)
+TASKS = {
+    "pld": ("pld_ccee/src/update_pld_2025.py", ()),
+    "pld_json": ("export_pld_json.py", ("pld",)),
+    "eolica": ("dashboard/atualizar_coff_monthly.py", ()),
+    "solar": ("dashboard/scripts/update_coff_solar_monthly_v3.py", ()),
+}
+
+
+# ------------------------------------------------------------
+# Saída com prefixo da tarefa
+# ------------------------------------------------------------
+# asyncio.to_thread copia o contexto, então o print de cada script sai
+# com o nome da tarefa que o chamou.
+_current_task = contextvars.ContextVar("current_task", default=None)
+
+
+class TaskPrefixedStream:
+    def __init__(self, stream):
+        self._stream = stream
+        self._lock = threading.Lock()
+        self._partial = {}
+
+    def write(self, text):
+        label = _current_task.get()
+        if label is None:
+            return self._stream.write(text)
+        with self._lock:
+            lines = (self._partial.pop(label, "") + text).split("\n")
+            if lines[-1]:
+                self._partial[label] = lines[-1]
+            for line in lines[:-1]:
+                self._stream.write(f"[{label}] {line}\n")
+        return len(text)
+
+    def flush(self):
+        self._stream.flush()
+
+    def end_task(self, label):
+        # última linha da tarefa sem "\n" não fica presa no buffer
+        with self._lock:
+            rest = self._partial.pop(label, "")
+            if rest:
+                self._stream.write(f"[{label}] {rest}\n")
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def end_task_output(label):
+    if isinstance(sys.stdout, TaskPrefixedStream):
+        sys.stdout.end_task(label)
+
+
+# ------------------------------------------------------------
+# Tarefas
+# ------------------------------------------------------------
+def load_script(rel_path: str):
+    """Importa o script pelo nome do arquivo (o diretório dele entra no
+    sys.path, então workers spawn do solar também o encontram)."""
+    path = os.path.join(REPO_DIR, rel_path)
+    script_dir = os.path.dirname(path)
+    if script_dir not in sys.path:
+        sys.path.insert(0, script_dir)
+    return importlib.import_module(os.path.splitext(os.path.basename(path))[0])
+
+
+def call_main(module, argv):
+    # scripts com argparse recebem argv; os outros, main() puro
+    if inspect.signature(module.main).parameters:
+        return module.main(argv)
+    return module.main()
+
+
+async def run_task(name, module, argv, deps, done, status):
+    for d in deps:
+        await done[d].wait()
+    failed = [d for d in deps if status[d][0] != "ok"]
+    if failed:
+        status[name] = ("pulado", 0.0)
+        print(f"[{name}] pulado: dependência falhou ({', '.join(failed)})")
+        done[name].set()
+        return
+
+    print(f"[{name}] início")
+    _current_task.set(name)
+    t0 = time.perf_counter()
+    try:
+        # thread, não processo: o parse em Python/pandas disputa o GIL
+        # com as outras tarefas (ver o cabeçalho)
+        await asyncio.to_thread(call_main, module, argv)
+        status[name] = ("ok", time.perf_counter() - t0)
+    except (Exception, SystemExit) as e:
+        status[name] = ("falhou", time.perf_counter() - t0)
+        end_task_output(name)
+        print(f"⚠️ falhou: {e!r}")
+        traceback.print_exc(file=sys.stdout)  # com o prefixo da tarefa
+    finally:
+        end_task_output(name)
+        _current_task.set(None)
+        print(f"[{name}] fim: {status[name][0]} em {status[name][1]:.1f}s")
+        done[name].set()
+
+
+async def run_all(selected, argvs):
+    # dependência fora da seleção conta como satisfeita
+    done = {n: asyncio.Event() for n in TASKS}
+    status = {n: ("ok", 0.0) for n in TASKS}
+    for n in TASKS:
+        if n not in selected:
+            done[n].set()
+
+    modules = {n: load_script(TASKS[n][0]) for n in selected}
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=len(selected),
+                                                 thread_name_prefix="tarefa"))
+    await asyncio.gather(*(
+        run_task(n, modules[n], argvs.get(n, []), TASKS[n][1], done, status)
+        for n in selected
+    ))
+    return {n: status[n] for n in selected}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Atualiza PLD + ONS num único processo.")
+    parser.add_argument(
+        "--only", nargs="+", choices=list(TASKS), default=list(TASKS),
+        help="roda só estas tarefas (padrão: todas)"
+    )
+    parser.add_argument(
+        "--solar-jobs", type=int, default=1,
+        help="processos para os meses do solar (padrão: 1)"
+    )
+    parser.add_argument(
+        "--sem-tail", action="store_true",
+        help="baixa e processa o mês corrente do ONS inteiro (sem --incremental)"
+    )
+    args = parser.parse_args()
+
+    sys.path.insert(0, REPO_DIR)
+    # mês corrente do ONS via tail: só as linhas novas desde ontem
+    tail = [] if args.sem_tail else ["--incremental"]
+    argvs = {
+        "pld": [],
+        "eolica": tail,
+        "solar": ["--jobs", str(args.solar_jobs), *tail],
+    }
+
+    sys.stdout = TaskPrefixedStream(sys.stdout)
+    t0 = time.perf_counter()
+    status = asyncio.run(run_all(args.only, argvs))
+    total = time.perf_counter() - t0
+
+    print("\nResumo:")
+    for n, (st, secs) in status.items():
+        print(f"  {n:<9} {st:<7} {secs:6.1f}s")
+    print(f"  total (relógio): {total:.1f}s | soma das tarefas: "
+          f"{sum(s for _, s in status.values()):.1f}s")
+
+    if any(st != "ok" for st, _ in status.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()